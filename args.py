@@ -1,5 +1,4 @@
 import argparse
-import commands
 from colors import *
 
 parser = argparse.ArgumentParser(
@@ -7,7 +6,7 @@ parser = argparse.ArgumentParser(
     description="Découpe et assemble des fichiers de data pour les web scanners",
     prog="serior"
 )
-parser.add_argument('-v', '--version', action='version', version='seriorch 1.4')
+parser.add_argument('-v', '--version', action='version', version='seriorch 1.5')
 parser.add_argument('-w', '--watch', action='store_true', help="Pour build et inject, refait l'action à chaque sauvegarde d'un fichier")
 subparsers = parser.add_subparsers(dest="command", title="Commandes", help="commandes")
 
@@ -15,19 +14,26 @@ init_parser = subparsers.add_parser('init', help="Initialise un projet")
 config_parser = subparsers.add_parser('config', help="Ouvre le fichier de config")
 
 build_parser = subparsers.add_parser('build', help="Compose un fichier de data à partir de ses composants")
+build_parser.add_argument('--all', metavar='DOSSIER', help="Compose en parallèle tous les projets trouvés dans DOSSIER")
 inject_parser = subparsers.add_parser('inject', help="Injecte les composants dans la base de données")
+inject_parser.add_argument('--report', action='store_true', help="Affiche la durée de chaque étape et le détail de chaque record, et les enregistre en JSON")
+inject_parser.add_argument('--dry-run', action='store_true', help="Comme --report, mais annule la transaction au lieu de la valider")
+inject_parser.add_argument('--seed', action='store_true', help="Crée d'abord les records absents des bases sqlite, pour mesurer ou tester l'injection sans base Odoo")
+dev_parser = subparsers.add_parser('dev', help="Compose et injecte à chaque sauvegarde d'un fichier, en lisant les composants une seule fois")
 lint_parser = subparsers.add_parser('lint', help="Lint les fichiers python et xml")
 
 unravel_parser = subparsers.add_parser('unravel', help="Décompose un fichier de data en ses composants")
-unravel_parser.add_argument('fichier', help="Fichier de data à décomposer")
+unravel_target = unravel_parser.add_mutually_exclusive_group(required=True)
+unravel_target.add_argument('fichier', nargs='?', help="Fichier de data à décomposer")
+unravel_target.add_argument('--tree', metavar='DOSSIER', help="Décompose en parallèle tous les fichiers de scénario de DOSSIER, chacun dans son projet")
+unravel_parser.add_argument('--stream', action='store_true', help="Lit le fichier record par record, pour les fichiers trop gros pour la mémoire")
 
 update_parser = subparsers.add_parser('update', help=B(BRD("NIY: Met à jour un fichier de data avec les composants")))
 update_parser.add_argument('fichier', help="Fichier de data à mettre à jour")
 
 
-def parse_args(config: dict) -> argparse.Namespace:
+def parse_args() -> argparse.Namespace:
     args = parser.parse_args()
     if 'fichier' in args:
         args.file = args.fichier
-    commands.do(args.command, config, args)
     return args
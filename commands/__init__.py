@@ -1,12 +1,8 @@
 import os
 from typing import Any
-from . import init
-from . import build
-from . import config as cfg
-from . import inject
-from . import unravel
-from . import watch
-from . import lint
+
+# Command modules are imported by the command that runs them, along with their
+# dependencies (lxml, psycopg2, inotify…), to keep the startup of the others short
 def do(command: str, config: dict, args: Any):
     """Execute the given command
 
@@ -15,22 +11,39 @@ def do(command: str, config: dict, args: Any):
     :param args: arguments the script wath invoked with
     """
     if args.watch or config.get('watch'):
-        wrapper = watch.watch
+        from .watch import watch as wrapper
     else:
         wrapper = lambda cb, *x: cb
 
     match command:
         case 'init':
+            from . import init
             init.init(config)
+        case 'unravel' if args.tree:
+            from . import unravel
+            unravel.unravel_tree(args.tree, config, stream=args.stream)
         case 'unravel':
-            unravel.unravel(args.file, config)
+            from . import unravel
+            unravel.unravel(args.file, config, stream=args.stream)
         case 'config':
+            from . import config as cfg
             cfg.config(os.environ['EDITOR'], config)
+        case 'build' if args.all:
+            from . import build
+            build.build_all(args.all, config)
         case 'build':
+            from . import build
             wrapper(build.build, config)(config)
         case 'inject':
-            wrapper(inject.inject, config)(config)
+            from . import inject
+            wrapper(inject.inject, config)(config, report=args.report, dry_run=args.dry_run, seed=args.seed)
+        case 'dev':
+            from . import dev, watch
+            # Starts from a project in sync with the data file and the DBs
+            dev.dev(config)
+            watch.watch(dev.dev, config)(config)
         case 'lint':
+            from . import lint
             lint.lint()
         case 'update':
             raise NotImplementedError
@@ -1,35 +1,252 @@
 """Builds an xml data file"""
 
-from models import utils
+import os
+import hashlib
+from time import perf_counter
+from typing import Any
+from collections.abc import Iterable, Iterator
+from colors import *
+from models import utils, live
+from models import Onchange, View, Style, Label, Param, Scenario
+from models.cache import FragmentCache, Manifest
 import shutil
 
-def build(config: dict) -> None:
-    """Create the final xml file, move or copy it to the destination"""
-    data_template = '\n'.join([
+def build(config: dict, quiet: bool = False, changed: set[str] | None = None) -> dict[str, Any]:
+    """Create the final xml file, write it to the destination and keep a
+    local copy if configured to. The destination is left untouched if its
+    content wouldn't change
+
+    :param config: program configuration
+    :param quiet: Don't print the report of the build
+    :param changed: Files modified since the last build (watch mode). The
+        records are then kept in memory between builds, only those affected by
+        these files are rebuilt
+    :return: Report of the build: whether the file was written, and the names
+        of the added, changed and removed records since the last build
+    """
+    if changed is not None:
+        model = live.get_model()
+        model.update(changed)
+        skeleton = model.skeleton
+        records = model.fragments()
+    else:
+        skeleton = utils.load_skeleton('skeleton.yaml')
+        cache = FragmentCache(os.path.join(config.get('cache_dir', '.serior'), 'fragments.json'))
+        records = list(make_fragments(skeleton, cache))
+        cache.save()
+
+    report = write_data_file(config, skeleton, records)
+    if not quiet and utils.is_foreground():
+        print_report(data_file_path(skeleton), report)
+    return report
+
+
+def data_file_path(skeleton: dict[str, Any]) -> str:
+    """Path of the data file of a project
+
+    :param skeleton: Content of the skeleton
+    """
+    return f"location/data_{skeleton.get('file_name', skeleton['prefix'])}.xml"
+
+
+def write_data_file(config: dict, skeleton: dict[str, Any], records: list[tuple[str, str]]) -> dict[str, Any]:
+    """Assembles the fragments of the records into the data file, written to
+    the destination unless its content wouldn't change, and keeps a local copy
+    if configured to
+
+    :param config: program configuration
+    :param skeleton: Content of the skeleton
+    :param records: Name and fragment of each record, in the order of the data file
+    :return: Report of the build, see ``build``
+    """
+    header = '\n'.join([
         '<?xml version="1.0" encoding="utf-8"?>',
         f"<{config['surrounding_tag']}>",
         "<data>",
-        "{}",
+        "",
+    ])
+    footer = '\n'.join([
+        "",
         "</data>",
         f"</{config['surrounding_tag']}>",
     ])
-    scen, onchanges, views, styles, labels, params = utils.rebuild_models('skeleton.yaml')
-    make_xml = lambda x: [y.to_xml() for y in x]
-    make_xml_opt = lambda x, y: [z.to_xml(y) for z in x]
-    record_xml = '\n'.join([
-        *make_xml(onchanges),
-        *make_xml(views),
-        *make_xml(styles),
-        scen.to_xml(),
-        *make_xml_opt(labels, scen.xml_id),
-        *make_xml_opt(params, scen.xml_id),
-    ])
+    manifest = Manifest(os.path.join(config.get('cache_dir', '.serior'), 'manifest.json'))
+    destination = data_file_path(skeleton)
 
-    with open(config['build_name'], 'w') as file:
-        file.write(data_template.format(record_xml))
+    chunks = [header, *_separate(fragment for _, fragment in records), footer]
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(chunk.encode())
+    record_digests = {name: hashlib.sha1(fragment.encode()).hexdigest() for name, fragment in records}
 
-    if config['keep_build']:
-        callback = shutil.copy2
-    else:
-        callback = shutil.move
-    callback(config['build_name'], f'location/data_{scen.file_name}.xml')
+    added, changed, removed = manifest.diff_records(destination, record_digests)
+    written = not manifest.is_current(destination, digest.hexdigest())
+    if written:
+        write_atomically(destination, chunks)
+    manifest.update(destination, digest.hexdigest(), record_digests)
+    manifest.save()
+
+    if config['keep_build'] and (written or not os.path.exists(config['build_name'])):
+        keep_copy(destination, config['build_name'])
+
+    return {'written': written, 'added': added, 'changed': changed, 'removed': removed}
+
+
+def print_report(destination: str, report: dict[str, Any]) -> None:
+    """Prints which records changed since the last build
+
+    :param destination: Path of the built file
+    :param report: Report returned by the build
+    """
+    name = os.path.basename(destination)
+    if not report['written']:
+        print(f"{name} inchangé")
+        return
+
+    print(B(f"{name} : {len(report['added'])} ajouté(s), {len(report['changed'])} modifié(s), {len(report['removed'])} supprimé(s)"))
+    for sign, color, key in [('+', GR, 'added'), ('~', YL, 'changed'), ('-', RD, 'removed')]:
+        for record in report[key]:
+            print(color(f"  {sign} {record}"))
+
+
+def write_atomically(path: str, chunks: Iterable[str]) -> None:
+    """Streams the chunks into a temporary file next to the destination, then
+    renames it over the destination. Readers never see a partially written file
+
+    :param path: Destination of the file
+    :param chunks: Content of the file
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def keep_copy(path: str, copy_path: str) -> None:
+    """Makes a local copy of the built file, as a hard link when possible
+
+    :param path: Path of the built file
+    :param copy_path: Path of the copy
+    """
+    if os.path.lexists(copy_path):
+        os.remove(copy_path)
+    try:
+        os.link(path, copy_path)
+    except OSError:
+        # Other filesystem, or one that doesn't do hard links
+        shutil.copy2(path, copy_path)
+
+
+def _separate(fragments: Iterable[str]) -> Iterator[str]:
+    """Interleaves newlines between the fragments"""
+    for i, fragment in enumerate(fragments):
+        if i:
+            yield '\n'
+        yield fragment
+
+
+def make_fragments(skeleton: dict[str, Any], cache: FragmentCache) -> Iterator[tuple[str, str]]:
+    """Produces the XML fragments of every record of the skeleton, in the order
+    they appear in the data file. Only the records absent from the cache are
+    rebuilt from their skeleton entry and serialized
+
+    :param skeleton: Content of the skeleton
+    :param cache: Cache of the fragments
+    :return: The name of each record (``<skeleton key>/<id>``) and its fragment,
+        produced one at a time
+    """
+    prefix = skeleton['prefix']
+    # Computed before rebuilding the scenario, which extends the lists of the skeleton
+    scen_key = cache.key(Scenario, skeleton)
+
+    def make_xml(model: type, key: str, *args) -> Iterator[tuple[str, str]]:
+        for entry in skeleton.get(key) or []:
+            fragment_key = cache.key(model, entry, prefix, model.code_file(entry['id']))
+            yield f"{key}/{entry['id']}", cache.get(
+                fragment_key, lambda: model.from_dict(entry, prefix).to_xml(*args))
+
+    yield from make_xml(Onchange, 'onchanges')
+    yield from make_xml(View, 'views')
+    yield from make_xml(Style, 'styles')
+    yield prefix, cache.get(scen_key, lambda: Scenario.from_dict(skeleton).to_xml())
+    yield from make_xml(Label, 'labels', prefix)
+    yield from make_xml(Param, 'params', prefix)
+
+
+def build_all(root: str, config: dict) -> None:
+    """Builds every project found under the root directory in parallel, then
+    prints a summary of the builds
+
+    :param root: Directory to search for projects
+    :param config: Global config. Overridden by each project's skeleton
+    """
+    projects = find_projects(root)
+    if not projects:
+        print(f"Aucun projet trouvé dans {root}")
+        return
+
+    start = perf_counter()
+    with utils.fork_pool(config) as pool:
+        results = list(pool.map(_build_project, projects))
+    total = perf_counter() - start
+
+    failures = 0
+    for project, duration, report, error in results:
+        name = os.path.relpath(project, root)
+        if error is None:
+            if report['written']:
+                count = len(report['added']) + len(report['changed']) + len(report['removed'])
+                status = f"{count} record(s) modifié(s)"
+            else:
+                status = "inchangé"
+            print(f"{GR(f'{duration:6.2f}s')}  {name} ({status})")
+        else:
+            failures += 1
+            print(f"{BRD(' ERREUR')}  {name}: {error}")
+    print(B(f"{len(results)} projets construits en {total:.2f}s, {failures} erreur(s)"))
+
+    if failures:
+        raise SystemExit(1)
+
+
+def find_projects(root: str) -> list[str]:
+    """Lists the projects under the root, i.e. the directories holding a skeleton
+
+    :param root: Directory to search for projects
+    :return: Absolute paths of the projects, sorted
+    """
+    projects = []
+    for path, dirnames, filenames in os.walk(os.path.abspath(root)):
+        if 'skeleton.yaml' in filenames:
+            projects.append(path)
+            # Projects aren't nested
+            dirnames.clear()
+        else:
+            dirnames[:] = [name for name in dirnames if name != '.git']
+    return sorted(projects)
+
+
+def _build_project(project: str) -> tuple[str, float, dict[str, Any] | None, str | None]:
+    """Builds a project in the worker process
+
+    :param project: Absolute path of the project
+    :return: Path of the project, duration of the build, report of the build
+        and error message if it failed
+    """
+    start = perf_counter()
+    try:
+        os.chdir(project)
+        config = utils.worker_config.copy()
+        # Same as the project-specific config applied at startup for a single build
+        config.update(utils.load_skeleton('skeleton.yaml').get('config') or {})
+        report = build(config, quiet=True)
+    except Exception as e:
+        return project, perf_counter() - start, None, f"{type(e).__name__}: {e}"
+    return project, perf_counter() - start, report, None
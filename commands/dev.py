@@ -0,0 +1,43 @@
+"""Builds and injects a project on each save, from a single parse"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from models import utils, live
+from . import build, inject
+
+def dev(config: dict[str, Any], changed: set[str] | None = None) -> None:
+    """Brings the data file and the DBs up to date with the saved files. The
+    records affected by the files are rebuilt once, in the live model, then
+    the data file is written while they are injected. Prints the duration of
+    each stage
+
+    :param config: program configuration
+    :param changed: Files modified since the last run. None for the whole
+        project, on the first run
+    """
+    stages: list[dict[str, Any]] = []
+    with utils.timed(stages, 'records'):
+        model = live.get_model()
+        records = model.records(model.update(changed))
+    with utils.timed(stages, 'fragments'):
+        fragments = model.fragments()
+
+    def write() -> dict[str, Any]:
+        with utils.timed(stages, 'build'):
+            return build.write_data_file(config, model.skeleton, fragments)
+
+    def inject_records() -> list[dict[str, Any]]:
+        with utils.timed(stages, 'inject'):
+            return inject.inject_records(config, records)
+
+    # The file is written while the injection waits on the DBs
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        injection = pool.submit(inject_records) if any(records) else None
+        report = pool.submit(write).result()
+        results = injection.result() if injection else []
+
+    if utils.is_foreground():
+        build.print_report(build.data_file_path(model.skeleton), report)
+        for result in results:
+            inject.print_report(result)
+        inject.print_phases(stages)
@@ -4,22 +4,28 @@ import os
 import subprocess
 from typing import Any
 
-def init(config: Any) -> None:
+def init(config: Any, git: bool = True) -> None:
     """
     - creates a git repo and its gitignore
     - pastes in the skeleton template
     - creates the symlink location
+
+    :param config: Global config
+    :param git: Create the git repo. Otherwise, the project is expected to be
+        committed along with others
     """
     with open('skeleton.yaml', 'w') as file:
         config['yaml_dump'](config['skeleton_template'], file)
 
     os.symlink(os.path.expanduser(config['default_destination']), 'location')
-    subprocess.run(['git','init'])
+    if git:
+        subprocess.run(['git','init'])
     with open('.gitignore', 'w') as file:
-        file.write(f"{config['build_name']}\nruff.toml\nlocation")
+        file.write(f"{config['build_name']}\nruff.toml\nlocation\n{config.get('cache_dir', '.serior')}")
 
     with open('ruff.toml', 'w') as file:
         file.write(f"builtins = {config.get('builtins')}\n")
 
-    subprocess.run(['git','add', '.'])
-    subprocess.run(['git','commit', '-m', 'init'])
+    if git:
+        subprocess.run(['git','add', '.'])
+        subprocess.run(['git','commit', '-m', 'init'])
@@ -1,10 +1,257 @@
+import os
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 from typing import Any
-from models import utils
-
-def inject(config: dict[str, Any]) -> None:
-    """Injects the data of the records in the DB. The records must already exist"""
-    _, onchanges, views, styles, labels, params = utils.rebuild_models('skeleton.yaml')
-    cursor = utils.get_db_cursor(config)
-    inject_ = lambda rcs: [rc.inject(cursor) for rc in rcs]
-    [inject_(records) for records in [onchanges, views, styles, labels, params]]
-    cursor.connection.commit()
+from colors import *
+from models import utils, live, Record
+from models.backend import BACKENDS
+
+def inject(
+    config: dict[str, Any],
+    changed: set[str] | None = None,
+    report: bool = False,
+    dry_run: bool = False,
+    seed: bool = False,
+) -> None:
+    """Injects the data of the records in the DBs, concurrently. The records
+    must already exist. Only the records whose content differs from the DB are
+    updated
+
+    :param config: program configuration
+    :param changed: Files modified since the last injection (watch mode). The
+        records are then kept in memory between injections, only those
+        affected by these files are rebuilt and injected. All of them are
+        injected when the skeleton is saved
+    :param report: Print the duration of each phase and the outcome of each
+        record, and save them as JSON in the cache directory
+    :param dry_run: Roll back instead of committing. Implies ``report``
+    :param seed: First create the rows of the records absent from the SQLite
+        DBs, to measure or check the injection without an Odoo DB
+    """
+    report = report or dry_run
+    phases: list[dict[str, Any]] = []
+    if changed is not None:
+        with utils.timed(phases, 'records'):
+            model = live.get_model()
+            records = model.records(model.update(changed))
+    else:
+        with utils.timed(phases, 'skeleton'):
+            data = utils.load_skeleton('skeleton.yaml')
+        with utils.timed(phases, 'records'):
+            _, *records = utils.models_from_skeleton(data)
+    if not any(records):
+        return
+    if seed:
+        with utils.timed(phases, 'seed'):
+            seed_records(config, records)
+    results = inject_records(config, records, detailed=report, commit=not dry_run)
+
+    if report:
+        path = os.path.join(config.get('cache_dir', '.serior'), 'inject_report.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'dry_run': dry_run, 'phases': phases, 'targets': results}, file, indent=1)
+
+    if utils.is_foreground():
+        if report:
+            print_phases(phases)
+        for result in results:
+            print_report(result)
+        if report:
+            print(f"Rapport JSON : {path}")
+
+    # In watch mode, the DBs that failed are tried again on the next save
+    if changed is None and any(result['error'] for result in results):
+        raise SystemExit(1)
+
+
+def seed_records(config: dict[str, Any], records: list[list[Record]]) -> None:
+    """Creates the rows of the records absent from the SQLite DBs of the
+    project. Other DBs are left untouched
+
+    :param config: program configuration
+    :param records: Records to create, grouped by type
+    """
+    module = utils.get_module()
+    for target in utils.get_db_targets(config):
+        name = BACKENDS[target['backend']].describe(target)
+        if target['backend'] != 'sqlite':
+            if utils.is_foreground():
+                print(YL(f"{name} : seules les bases sqlite sont remplies, ignorée"))
+            continue
+        created = utils.get_db_backend(target).seed(module, [rc for group in records for rc in group])
+        if created and utils.is_foreground():
+            print(f"{name} : {created} record(s) créé(s)")
+
+
+def inject_records(
+    config: dict[str, Any],
+    records: list[list[Record]],
+    detailed: bool = False,
+    commit: bool = True,
+) -> list[dict[str, Any]]:
+    """Injects records in the DBs of the project, concurrently
+
+    :param config: program configuration
+    :param records: Records to inject, grouped by type
+    :param detailed: Also report the payload size and updated rows of each record
+    :param commit: Commit the transactions, roll them back otherwise
+    :return: Report of the injection into each DB, see ``inject_target``
+    """
+    targets = utils.get_db_targets(config)
+    module = utils.get_module()
+
+    run = lambda target: inject_target(target, module, records, detailed=detailed, commit=commit)
+    if len(targets) == 1:
+        return [run(targets[0])]
+    # Threads spend their time waiting on the DBs, not holding the GIL
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        return list(pool.map(run, targets))
+
+
+def inject_target(
+    target: dict[str, Any],
+    module: str,
+    records: list[list[Record]],
+    detailed: bool = False,
+    commit: bool = True,
+) -> dict[str, Any]:
+    """Injects the records in a DB, in a single transaction. Records are found
+    by their xml_id, only the rows that belong to them are updated
+
+    :param target: Connection parameters of the DB
+    :param module: Module of the scenario, owning the xml_ids of the records
+    :param records: Records to inject, grouped by type
+    :param detailed: Also report the payload size and updated rows of each record
+    :param commit: Commit the transaction, roll it back otherwise
+    :return: Report of the injection: name of the DB, module, duration of
+        each phase and in total, number of injected and unchanged records,
+        xml_ids of the records absent from the DB and of those it doesn't
+        synchronize, details of each record if
+        requested and the error that interrupted the injection, if any
+    """
+    report = {
+        'target': BACKENDS[target['backend']].describe(target),
+        'module': module,
+        'phases': [],
+        'injected': 0,
+        'unchanged': 0,
+        'missing': [],
+        'unsynchronized': [],
+        'records': [],
+        'error': None,
+    }
+    phases = report['phases']
+    start = perf_counter()
+    backend = None
+    try:
+        with utils.timed(phases, 'connection'):
+            backend = utils.get_db_backend(target)
+        with utils.timed(phases, 'xml_ids'):
+            ids = backend.resolve_ids(module, [rc for group in records for rc in group])
+        for group in records:
+            if not group:
+                continue
+            model = type(group[0])
+            model_ids = ids.get(model._xml_model, {})
+            with utils.timed(phases, f"{model.__name__} digests"):
+                outdated, absent, excluded = model.outdated(backend, group, model_ids)
+            updated = []
+            if outdated:
+                with utils.timed(phases, f"{model.__name__} update"):
+                    updated = model.bulk_inject(backend, outdated, model_ids)
+            report['injected'] += len(outdated)
+            report['unchanged'] += len(group) - len(outdated) - len(absent) - len(excluded)
+            report['missing'].extend(rc.xml_id for rc in absent)
+            report['unsynchronized'].extend(rc.xml_id for rc in excluded)
+            if detailed:
+                report['records'].extend(_record_details(group, outdated, absent, excluded, model_ids, updated))
+
+        with utils.timed(phases, 'commit' if commit else 'rollback'):
+            if commit:
+                backend.commit()
+            else:
+                backend.rollback()
+    except Exception as e:
+        # The connection outlives the injection in watch mode
+        if backend is not None and not backend.closed:
+            backend.rollback()
+        report['error'] = f"{type(e).__name__}: {e}"
+    report['duration'] = perf_counter() - start
+    return report
+
+
+def _record_details(
+    records: list[Record],
+    outdated: list[Record],
+    absent: list[Record],
+    excluded: list[Record],
+    ids: dict[str, int],
+    updated: list[int],
+) -> list[dict[str, Any]]:
+    """Describes the outcome of the injection of records of a same type
+
+    :param records: Records of the type
+    :param outdated: Records that were injected
+    :param absent: Records absent from the DB
+    :param excluded: Records whose rows the DB doesn't synchronize
+    :param ids: DB ids of the records, by xml_id
+    :param updated: DB ids of the updated rows
+    :return: xml_id, type, status, payload size in bytes and updated rows of each record
+    """
+    # Records are compared by identity
+    absent_set, excluded_set, outdated_set = set(absent), set(excluded), set(outdated)
+    rows = Counter(updated)
+    details = []
+    for rc in records:
+        if rc in absent_set:
+            status = 'absent'
+        elif rc in excluded_set:
+            status = 'non synchronisé'
+        elif rc in outdated_set:
+            status = 'injecté'
+        else:
+            status = 'inchangé'
+        details.append({
+            'xml_id': rc.xml_id,
+            'type': type(rc).__name__,
+            'status': status,
+            'size': sum(len(str(value).encode()) for value in rc._db_values().values()),
+            'rows': rows[ids[rc.xml_id]] if rc in outdated_set else 0,
+        })
+    return details
+
+
+def print_phases(phases: list[dict[str, Any]]) -> None:
+    """Prints the duration of each phase
+
+    :param phases: Name and duration of each phase
+    """
+    for phase in phases:
+        print(f"  {phase['name']:<30} {phase['duration'] * 1000:9.1f} ms")
+
+
+def print_report(report: dict[str, Any]) -> None:
+    """Prints the outcome of the injection into a DB, with the duration of
+    each phase and the details of each record if they were gathered
+
+    :param report: Report returned by ``inject_target``
+    """
+    if report['error']:
+        print(f"{BRD('ERREUR')} {report['target']} : {report['error'].strip()}")
+        return
+
+    print(f"{report['target']} : {report['injected']} record(s) injecté(s), "
+          f"{report['unchanged']} inchangé(s) en {report['duration']:.2f}s")
+    if report['records']:
+        print_phases(report['phases'])
+        print(B(f"  {'record':<40} {'type':<9} {'statut':<15} {'taille':>9} {'lignes':>6}"))
+        for details in report['records']:
+            print(f"  {details['xml_id']:<40} {details['type']:<9} {details['status']:<15} "
+                  f"{details['size']:>7} o {details['rows']:>6}")
+    for xml_id in report['missing']:
+        print(YL(f"  {xml_id} absent de la base pour le module {report['module']}, ignoré"))
+    for xml_id in report['unsynchronized']:
+        print(YL(f"  {xml_id} non synchronisé dans la base, ignoré"))
@@ -1,27 +1,46 @@
 """Extracts the components of a data file"""
 
 import os
+import re
+import shutil
 import subprocess
-from typing import TypeAlias
+from time import perf_counter
+from typing import Any, TypeAlias
+from collections.abc import Iterable
 # TODO: figure out why on earth this is fine. but `from .. import models` is wrong
 import models
 from commands.init import init
 from lxml import etree
+from colors import *
 
 
-def unravel(data_file: str, config: dict) -> None:
+def unravel(
+    data_file: str,
+    config: dict,
+    stream: bool = False,
+    git: bool = True,
+    quiet: bool = False,
+) -> dict[str, list[str]]:
     """Takes a data file and decomposes it.
     - Initializes the project if not done before
-    - creates the files
+    - creates the files, only those whose content changed
     - populates the skeleton
     - updates the destination location
 
     :param data_file: Path to file to decompose
     :param confing: Global config. Used to test for auto-commit on unraveling
+    :param stream: Parse the file record by record, with bounded memory
+    :param git: Initialize and commit the project. Otherwise, it's committed
+        along with others
+    :param quiet: Don't print the number of files written
+    :return: Paths of the files added, changed and left unchanged
     """
     records: dict[str, list[models.Record]]
     # Also creates records files
-    records = {key:list(val.values()) for key, val in _parse_file(data_file).items()}
+    parsed, unknown = _stream_file(data_file) if stream else _parse_file(data_file)
+    records = {key:list(val.values()) for key, val in parsed.items()}
+    for model, count in unknown.items():
+        print(YL(f"{count} record(s) du modèle {model} ignoré(s), type de record inconnu"))
     if records['menu'][0].xml_id not in data_file:
         file_suffix = (os.path.basename(data_file)
                        .split('data')[-1]
@@ -31,35 +50,176 @@ def unravel(data_file: str, config: dict) -> None:
         records['menu'][0].file_name = file_suffix
 
 
-    if not os.path.exists('skeleton.yaml'):
-        init(config)
+    try:
+        if not os.path.exists('skeleton.yaml'):
+            init(config, git=git)
 
-    models.utils.make_skeleton(
-        config,
-        'skeleton.yaml',
-        records['onchange'],
-        records['view'],
-        records['style'],
-        records['label'],
-        records['param'],
-        records['menu'][0],
-    )
+        report = models.utils.make_skeleton(
+            config,
+            'skeleton.yaml',
+            records['onchange'],
+            records['view'],
+            records['style'],
+            records['label'],
+            records['param'],
+            records['menu'][0],
+        )
+    finally:
+        _remove_spilled(rc for rcs in records.values() for rc in rcs)
 
     # Update destination symlink, we *do* want to discard the previous one
     destination = os.path.dirname(data_file)
-    try:
-        os.remove('location')
-    except:
-        pass
-    os.symlink(destination, 'location')
+    if not os.path.islink('location') or os.readlink('location') != destination:
+        try:
+            os.remove('location')
+        except:
+            pass
+        os.symlink(destination, 'location')
 
-    if config['unravel_commit']:
+    if not quiet:
+        print(_count_files(report))
+    if git and config['unravel_commit'] and (report['added'] or report['changed']):
         subprocess.run('git add .; git commit --no-verify -m "Unravel"', shell=True)
+    return report
+
+
+def _count_files(report: dict[str, list[str]]) -> str:
+    """Summary of the files written by an unraveling"""
+    return (f"{len(report['added'])} fichier(s) ajouté(s), {len(report['changed'])} modifié(s), "
+            f"{len(report['unchanged'])} inchangé(s)")
+
+
+def unravel_tree(root: str, config: dict, stream: bool = False) -> None:
+    """Decomposes every scenario data file found under the root directory in
+    parallel, each into its own project in the current directory. The
+    projects are committed together at the end, then a summary is printed
+
+    :param root: Directory to search for data files, e.g. the data directory of an addon
+    :param config: Global config. Used to test for auto-commit on unraveling
+    :param stream: Parse the files record by record, with bounded memory
+    """
+    data_files = find_data_files(root)
+    if not data_files:
+        print(f"Aucun fichier de data trouvé dans {root}")
+        return
+
+    start = perf_counter()
+    tasks = [(data_file, _project_dir(os.path.relpath(data_file, root)), stream) for data_file in data_files]
+    with models.utils.fork_pool(config) as pool:
+        results = list(pool.map(_unravel_file, tasks))
+    total = perf_counter() - start
+
+    failures = skipped = 0
+    for data_file, project, duration, report, error in results:
+        name = os.path.relpath(data_file, root)
+        if error is None:
+            print(f"{GR(f'{duration:6.2f}s')}  {name} -> {project} ({_count_files(report)})")
+        elif project is None:
+            skipped += 1
+            print(f"{YL('  ignoré')}  {name}: {error}")
+        else:
+            failures += 1
+            print(f"{BRD(' ERREUR')}  {name}: {error}")
+    unravelled = len(results) - failures - skipped
+    print(B(f"{unravelled} fichier(s) décomposé(s) en {total:.2f}s, {skipped} ignoré(s), {failures} erreur(s)"))
+
+    if unravelled and config['unravel_commit']:
+        inside_repo = subprocess.run(['git', 'rev-parse', '--is-inside-work-tree'], capture_output=True).returncode == 0
+        if not inside_repo:
+            subprocess.run(['git', 'init'])
+        subprocess.run(f'git add .; git commit --no-verify -m "Unravel {unravelled} scénarios"', shell=True)
+
+    if failures:
+        raise SystemExit(1)
+
+
+def find_data_files(root: str) -> list[str]:
+    """Lists the xml files under the root
+
+    :param root: Directory to search for data files
+    :return: Absolute paths of the files, sorted
+    """
+    data_files = []
+    for path, dirnames, filenames in os.walk(os.path.abspath(root)):
+        dirnames[:] = [name for name in dirnames if name != '.git']
+        data_files.extend(os.path.join(path, name) for name in filenames if name.endswith('.xml'))
+    return sorted(data_files)
+
+
+def _project_dir(data_file: str) -> str:
+    """Directory of the project of a data file: its name without ``data_``
+    and extension, in the same subdirectory
+
+    :param data_file: Path of the data file, relative to the searched directory
+    """
+    directory, name = os.path.split(data_file)
+    name = name.removesuffix('.xml')
+    return os.path.join(directory, name.removeprefix('data_') or name)
+
+
+RE_SCENARIO = re.compile(r"""model=["']ir\.ui\.menu\.ionic["']""")
+
+def _is_scenario(data_file: str) -> bool:
+    """Whether the data file holds a scenario, without parsing it"""
+    with open(data_file, 'r') as file:
+        return any(RE_SCENARIO.search(line) for line in file)
+
+
+def _unravel_file(
+    task: tuple[str, str, bool],
+) -> tuple[str, str | None, float, dict[str, list[str]] | None, str | None]:
+    """Decomposes a data file into its project in the worker process
+
+    :param task: Absolute path of the data file, directory of its project and
+        whether to stream the parsing
+    :return: Path of the data file, directory of its project (None if the file
+        was skipped), duration of the unraveling, files written and error
+        message if it failed or was skipped
+    """
+    data_file, project, stream = task
+    start = perf_counter()
+    if not _is_scenario(data_file):
+        return data_file, None, perf_counter() - start, None, "pas de scénario"
+    cwd = os.getcwd()
+    created = not os.path.exists(project)
+    report = error = None
+    try:
+        os.makedirs(project, exist_ok=True)
+        os.chdir(project)
+        report = unravel(data_file, models.utils.worker_config, stream=stream, git=False, quiet=True)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        os.chdir(cwd)
+    # Don't leave half-made projects behind to be committed with the others
+    if error is not None and created:
+        shutil.rmtree(project, ignore_errors=True)
+    return data_file, project, perf_counter() - start, report, error
 
 
 Record: TypeAlias = models.Onchange | models.View | models.Style | models.Label | models.Param | models.Scenario
-def _parse_file(path: str) -> dict[str, dict[str, Record]]:
-    """Parses the given file and extracts the models inside"""
+
+# Record types, by model of their <record> tags: key of their records in the
+# result of the parsing, and class
+RECORD_TYPES: dict[str, tuple[str, type[models.Record]]] = {
+    cls._xml_model: (key, cls) for key, cls in [
+        ('onchange', models.Onchange),
+        ('view', models.View),
+        ('label', models.Label),
+        ('param', models.Param),
+        ('style', models.Style),
+        ('menu', models.Scenario),
+    ]
+}
+
+def _parse_file(path: str) -> tuple[dict[str, dict[str, Record]], dict[str, int]]:
+    """Parses the given file and extracts the models inside, in a single pass
+    over its records
+
+    :param path: Path to the data file
+    :return: The records by xml_id, by type, and the number of records of each
+        model that isn't a known record type
+    """
 
     # Remove newlines between tags, replace all other with something else to circumvent
     # the xml specification's most bright idea of removing any and all newline it can
@@ -70,49 +230,101 @@ def _parse_file(path: str) -> dict[str, dict[str, Record]]:
         #content = re.sub('>[ \n]*<', '><', content)
         #content = content.replace('\n', '&#182;')
     root = etree.fromstring(bytes(content, 'utf-8'))
+    # Views take their architecture straight from the text
+    source = models.view.SourceText(content)
+
+    records: dict[str, dict[str, Record]] = {key: {} for key, _ in RECORD_TYPES.values()}
+    unknown: dict[str, int] = {}
+    for node in root.iter('record'):
+        _add_record(node, source, records, unknown)
+
+    return records, unknown
+
+
+def _stream_file(path: str) -> tuple[dict[str, dict[str, Record]], dict[str, int]]:
+    """Parses the given file record by record, without holding it in memory.
+    The code of each record is written to a temporary file as soon as it's
+    parsed, and its element discarded
+
+    :param path: Path to the data file
+    :return: The records by xml_id, by type, and the number of records of each
+        model that isn't a known record type
+    """
+    records: dict[str, dict[str, Record]] = {key: {} for key, _ in RECORD_TYPES.values()}
+    unknown: dict[str, int] = {}
+    with open(path, 'rb') as binary, open(path, 'r') as text:
+        # Same as the stripped content given to the parser otherwise, lines
+        # are counted from the first tag
+        start = 0
+        while binary.read(1).isspace():
+            start += 1
+        binary.seek(start)
+        source = models.view.StreamedText(text)
+
+        pending = None
+        try:
+            for event, node in etree.iterparse(binary, events=('start', 'end')):
+                # A record is handled once the node after it started, views
+                # are bounded by it
+                if pending is not None:
+                    _consume_record(pending, source, records, unknown)
+                    pending = None
+                if event == 'end' and node.tag == 'record':
+                    pending = node
+            if pending is not None:
+                _consume_record(pending, source, records, unknown)
+        except BaseException:
+            _remove_spilled(rc for rcs in records.values() for rc in rcs.values())
+            raise
+
+    return records, unknown
+
+
+def _add_record(
+    node: Any,
+    source: models.view.SourceText | models.view.StreamedText,
+    records: dict[str, dict[str, Record]],
+    unknown: dict[str, int],
+) -> Record | None:
+    """Reconstructs a record from its node and adds it to the records of its type
+
+    :param node: Node of the record
+    :param source: Text of the data file, for the views
+    :param records: Records by xml_id, by type
+    :param unknown: Number of records of each unknown model, updated if the
+        record's model is one of them
+    :return: The record, None if its model is unknown
+    """
+    model = node.get('model')
+    if model not in RECORD_TYPES:
+        unknown[model] = unknown.get(model, 0) + 1
+        return None
+    key, cls = RECORD_TYPES[model]
+    record = cls.from_xml(node, source) if cls is models.View else cls.from_xml(node)
+    records[key][record.xml_id] = record
+    return record
+
+
+def _consume_record(
+    node: Any,
+    source: models.view.StreamedText,
+    records: dict[str, dict[str, Record]],
+    unknown: dict[str, int],
+) -> None:
+    """Adds a record, moves its code out of memory and discards its node along
+    with the nodes before it"""
+    record = _add_record(node, source, records, unknown)
+    if record is not None:
+        record.spill_code()
+    node.clear()
+    parent = node.getparent()
+    while node.getprevious() is not None:
+        del parent[0]
+
 
-    onchanges = root.xpath('//record[@model="manual.onchange"]')
-    views = root.xpath('//record[@model="ir.ui.view.ionic"]')
-    labels = root.xpath('//record[@model="ir.ui.menu.ionic.label"]')
-    params = root.xpath('//record[@model="ir.ui.menu.ionic.param"]')
-    scenarios = root.xpath('//record[@model="ir.ui.menu.ionic"]')
-    css_pages = root.xpath('//record[@model="ir.ui.css.ionic"]')
-
-    oc_dict = {}
-    for onchange in onchanges:
-        _ = models.Onchange.from_xml(onchange)
-        oc_dict[_.xml_id] = _
-
-    views_dict = {}
-    for view in views:
-        _ = models.View.from_xml(view, path)
-        views_dict[_.xml_id] = _
-
-    labels_dict = {}
-    for label in labels:
-        _ = models.Label.from_xml(label)
-        labels_dict[_.xml_id] = _
-
-    params_dict = {}
-    for param in params:
-        _ = models.Param.from_xml(param)
-        params_dict[_.xml_id] = _
-
-    css_pages_dict = {}
-    for css_page in css_pages:
-        _ = models.Style.from_xml(css_page)
-        css_pages_dict[_.xml_id] = _
-
-    menus_dict = {}
-    for scenario in scenarios:
-        _ = models.Scenario.from_xml(scenario)
-        menus_dict[_.xml_id] = _
-
-    return {
-        'onchange': oc_dict,
-        'view': views_dict,
-        'label': labels_dict,
-        'param': params_dict,
-        'style': css_pages_dict,
-        'menu': menus_dict,
-    }
+def _remove_spilled(records: Iterable[Record]) -> None:
+    """Removes the temporary code files of records that were never given their final name"""
+    for record in records:
+        spilled = getattr(record, '_spilled', None)
+        if spilled is not None and os.path.exists(spilled):
+            os.remove(spilled)
@@ -1,34 +1,179 @@
-from time import sleep
+from time import monotonic
 from typing import Any
 import re
 import os
-import inotify.adapters
+import queue
+import threading
+import struct
+import inotify.calls
+from inotify import constants
+from collections.abc import Iterator
+from models import utils
 
 # Some editors recreate an inode for every write. This helps ensure only the correct
 # files trigger the command (temporary files are usually not named like regular files)
 END_EXT_RE = re.compile('\.(xml|css|py|yaml)$')
 
+# Saved files, and the directories to watch or stop watching
+MASK = constants.IN_CLOSE_WRITE | constants.IN_MOVED_TO | constants.IN_MOVED_FROM | constants.IN_CREATE
+
+# Watch descriptor, mask, cookie and name length of a ``struct inotify_event``
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class _TreeWatcher:
+    """Watches a directory and its subdirectories, except the excluded ones.
+
+    Events are read straight from the inotify descriptor rather than through
+    ``inotify.adapters``, which drops the overflows of the kernel queue, as
+    they don't belong to a watch (descriptor -1)"""
+
+    def __init__(self, excluded: set[str]):
+        """
+        :param excluded: Names of the directories not to watch
+        """
+        self.excluded = excluded
+        self._fd = inotify.calls.inotify_init()
+        # Path of each watch descriptor, and the other way around
+        self._paths: dict[int, str] = {}
+        self._watches: dict[str, int] = {}
+
+    def add_tree(self, root: str) -> list[str]:
+        """Watches a directory and its subdirectories that aren't watched yet
+
+        :param root: Path of the directory, relative to the watched directory
+        :return: Paths of the files of the tree
+        """
+        files = []
+        for path, dirnames, filenames in os.walk(root):
+            path = os.path.normpath(path)
+            if path not in self._watches:
+                try:
+                    wd = inotify.calls.inotify_add_watch(self._fd, path.encode(), MASK)
+                except inotify.calls.InotifyError:
+                    # Removed since it was listed
+                    dirnames.clear()
+                    continue
+                self._paths[wd] = path
+                self._watches[path] = wd
+            dirnames[:] = [name for name in dirnames if name not in self.excluded]
+            files.extend(os.path.normpath(os.path.join(path, name)) for name in filenames)
+        return files
+
+    def remove_tree(self, root: str) -> None:
+        """Stops watching a directory and its subdirectories
+
+        :param root: Path of the directory
+        """
+        for path in [path for path in self._watches if path == root or path.startswith(f"{root}/")]:
+            wd = self._watches[path]
+            self._forget(wd)
+            try:
+                inotify.calls.inotify_rm_watch(self._fd, wd)
+            except inotify.calls.InotifyError:
+                # Already dropped by the kernel
+                pass
+
+    def _forget(self, wd: int) -> None:
+        """Drops the path of a watch descriptor"""
+        path = self._paths.pop(wd, None)
+        if path is not None:
+            self._watches.pop(path, None)
+
+    def events(self) -> Iterator[tuple[int, str]]:
+        """Reads the events as they come, blocking until there are some.
+        Overflows are yielded with the path ``.``, the watched directory
+
+        :return: Mask of each event and path of the file it concerns
+        """
+        while True:
+            data = os.read(self._fd, 64 * 1024)
+            offset = 0
+            # The kernel only hands over whole events
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length]
+                offset += EVENT_HEADER.size + length
+                if mask & constants.IN_Q_OVERFLOW:
+                    yield mask, '.'
+                elif mask & constants.IN_IGNORED:
+                    # The directory was removed, its watch with it
+                    self._forget(wd)
+                elif wd in self._paths:
+                    yield mask, os.path.normpath(os.path.join(self._paths[wd], name.rstrip(b'\0').decode()))
+
+
+def _collect(watcher: _TreeWatcher, events: queue.Queue) -> None:
+    """Hands the paths of the saved files to the queue as sets, one per event.
+    Runs on its own thread, so that the kernel queue is drained while the
+    command runs. Directories are watched as they appear. After an overflow,
+    saves may have been missed: every file of the tree is handed over
+
+    :param watcher: Watcher of the tree
+    :param events: Queue of the saved files. Receives the exception that
+        stopped the collection, if any
+    """
+    try:
+        for mask, path in watcher.events():
+            if mask & constants.IN_Q_OVERFLOW:
+                if utils.is_foreground():
+                    print("Trop de modifications à la fois, tous les fichiers sont relus")
+                events.put(set(watcher.add_tree('.')))
+            elif mask & constants.IN_ISDIR:
+                if mask & constants.IN_MOVED_FROM:
+                    watcher.remove_tree(path)
+                elif os.path.basename(path) not in watcher.excluded:
+                    # Its files may have been written before it was watched
+                    events.put(set(watcher.add_tree(path)))
+            elif mask & (constants.IN_CLOSE_WRITE | constants.IN_MOVED_TO):
+                events.put({path})
+    except Exception as e:
+        events.put(e)
+
+
 def watch(command, config, *args, **kwargs):
-    """Watch the dir for file writes. Executes the command on file save
+    """Watch the dir and its subdirs for file writes. Executes the command once
+    the files stop being saved for the quiet window (``watch_debounce``
+    seconds): saves close to each other, and those made while the command
+    runs, trigger a single run
 
-    :param command: Callback to the command to execute
+    :param command: Callback to the command to execute. Receives the modified
+        files, relative to the dir, with the ``changed`` keyword argument
     """
-    def wrapper(*args, **kwargs):
-        i = inotify.adapters.Inotify()
-        i.add_watch('.')
+    window = config.get('watch_debounce', 0.3)
+    build_name = os.path.normpath(config['build_name'])
+    # The built file and its destination are written by the commands
+    excluded = {'.git', 'location', os.path.basename(config.get('cache_dir', '.serior'))}
+    is_source = lambda path: path != build_name and END_EXT_RE.search(path)
 
+    def wrapper(*args, **kwargs):
+        watcher = _TreeWatcher(excluded)
+        watcher.add_tree('.')
+        events: queue.Queue[set[str] | Exception] = queue.Queue()
+        threading.Thread(target=_collect, args=(watcher, events), daemon=True).start()
 
+        # Files saved since the last run, and when they can be handed to the command
+        pending: set[str] = set()
+        deadline = 0.0
         try:
-            for event in i.event_gen(yield_nones=False):
-                (_, type_names, path, filename) = event
-                if ('IN_CLOSE_WRITE' in type_names 
-                    and filename != config['build_name']
-                    and END_EXT_RE.search(filename)
-                ):
-                    # Process' group and and its stdout's group differ if run in brackground
-                    if os.getpgrp() == os.tcgetpgrp(1):
-                        print(f"{filename} modifié")
-                    command(*args, **kwargs)
+            while True:
+                try:
+                    saved = events.get(timeout=max(deadline - monotonic(), 0) if pending else None)
+                except queue.Empty:
+                    changed = pending
+                    pending = set()
+                    if utils.is_foreground():
+                        print(f"{', '.join(sorted(changed))} modifié(s)")
+                    command(*args, changed=changed, **kwargs)
+                    continue
+
+                if isinstance(saved, Exception):
+                    raise saved
+                saved = {path for path in saved if is_source(path)}
+                if saved:
+                    # Supersedes the run that was about to start
+                    pending |= saved
+                    deadline = monotonic() + window
         except KeyboardInterrupt:
             pass
     return wrapper
@@ -1,12 +1,9 @@
 #!/bin/env python
 import os
-import yaml
 import shutil
+from typing import Any
 import args
-
-class IndentDumper(yaml.Dumper):
-    def increase_indent(self, flow=False, indentless=False):
-        return super().increase_indent(flow, False)
+import commands
 
 try:
     real_path = os.readlink(__file__)
@@ -25,22 +22,41 @@ def ensure_config_exists() -> str:
 
     return f"{config_dir}/seriorch/config.yaml"
 
-config = {
-    'config_file': ensure_config_exists(),
-    'yaml_dump': lambda content, file: yaml.dump(content, file, sort_keys=False, Dumper=IndentDumper),
-}
+def load_config() -> dict[str, Any]:
+    """Reads the config, the skeleton template, and the project-specific
+    config items of the skeleton in the current directory"""
+    import yaml
+
+    class IndentDumper(yaml.Dumper):
+        def increase_indent(self, flow=False, indentless=False):
+            return super().increase_indent(flow, False)
+
+    config = {
+        'config_file': ensure_config_exists(),
+        'yaml_dump': lambda content, file: yaml.dump(content, file, sort_keys=False, Dumper=IndentDumper),
+    }
+
+    with open(f"{project_dir}/data/skeleton_template.yaml", 'r') as file:
+        config['skeleton_template'] = yaml.full_load(file)
+
+    with open(config['config_file'], 'r') as file:
+        config.update(yaml.full_load(file))
 
-with open(f"{project_dir}/data/skeleton_template.yaml", 'r') as file:
-    config['skeleton_template'] = yaml.full_load(file)
+    # Allows project-specific config items to be defined in the skeleton
+    if os.path.exists('skeleton.yaml'):
+        with open('skeleton.yaml', 'r') as file:
+            skeleton_content = yaml.full_load(file)
+            if 'config' in skeleton_content:
+                config.update(skeleton_content['config'])
 
-with open(config['config_file'], 'r') as file:
-    config.update(yaml.full_load(file))
+    return config
 
-# Allows project-specific config items to be defined in the skeleton
-if os.path.exists('skeleton.yaml'):
-    with open('skeleton.yaml', 'r') as file:
-        skeleton_content = yaml.full_load(file)
-        if 'config' in skeleton_content:
-            config.update(skeleton_content['config'])
+# Options such as --version and --help are handled before anything is read
+arguments = args.parse_args()
+if arguments.command == 'config':
+    # Only opens the file
+    config = {'config_file': ensure_config_exists()}
+else:
+    config = load_config()
 
-args.parse_args(config)
+commands.do(arguments.command, config, arguments)
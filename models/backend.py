@@ -0,0 +1,376 @@
+"""Backends of the DBs the records are injected into.
+
+A backend holds the connection to a DB and renders the queries of the
+injection in the SQL dialect of the DB. ``PostgresBackend`` talks to the Odoo
+DBs. ``SqliteBackend`` is an in-process stand-in with the same tables, to
+measure or check the injection without a DB server.
+"""
+
+import json
+import hashlib
+import sqlite3
+from abc import abstractmethod
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .record import Record
+
+
+class Backend:
+    port: int | None = None # Port of the DB server, None for in-process DBs
+
+    @abstractmethod
+    def __init__(self, target: dict[str, Any]):
+        """Connects to the DB
+
+        :param target: Connection parameters of the DB, see ``utils.get_db_targets``
+        """
+
+    @staticmethod
+    def describe(target: dict[str, Any]) -> str:
+        """Name of the DB, for reports"""
+        return f"{target['database']}@{target['host']}:{target['port']}"
+
+    @property
+    @abstractmethod
+    def closed(self) -> bool:
+        """Whether the connection was closed"""
+
+    @abstractmethod
+    def is_alive(self) -> bool:
+        """Checks the connection can still be used, discarding any transaction
+        left open by a failed injection"""
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def digest(self, value: Any) -> str | None:
+        """md5 of a value as the DB computes it from its text representation
+
+        :param value: Value of a column
+        :return: Hex digest, None for NULL values
+        """
+        if value is None:
+            return None
+        return hashlib.md5(str(value).encode()).hexdigest()
+
+    def resolve_ids(self, module: str, records: list["Record"]) -> dict[str, dict[str, int]]:
+        """Fetches the DB ids of the records from their xml_id, in a single
+        query. xml_ids without module belong to the given module
+
+        :param module: Module of the scenario
+        :param records: Records of any type
+        :return: DB ids by xml_id, by model. Records absent from the DB are omitted
+        """
+        keys = []
+        for rc in records:
+            rc_module, _, name = rc.xml_id.rpartition('.')
+            keys.append((rc_module or module, name, rc._xml_model, rc.xml_id))
+
+        ids: dict[str, dict[str, int]] = {}
+        for model, xml_id, res_id in self._select_ids(keys):
+            ids.setdefault(model, {})[xml_id] = res_id
+        return ids
+
+    @abstractmethod
+    def _select_ids(self, keys: list[tuple[str, str, str, str]]) -> list[tuple[str, str, int]]:
+        """Joins the records with ir_model_data
+
+        :param keys: Module, name, model and xml_id of each record
+        :return: Model, xml_id and DB id of each record found
+        """
+
+    @abstractmethod
+    def digests(
+        self,
+        table: str,
+        reads: dict[str, str],
+        condition: str | None,
+        ids: list[int],
+    ) -> dict[int, dict[str, str | None] | None]:
+        """Fetches digests of the columns of rows, in a single query
+
+        :param table: Table of the rows
+        :param reads: SQL expression reading each column
+        :param condition: Additional SQL condition on the rows to update
+        :param ids: DB ids of the rows
+        :return: Digest of each column, by DB id. None for the rows that don't
+            satisfy the condition
+        """
+
+    @abstractmethod
+    def update(
+        self,
+        table: str,
+        writes: dict[str, str],
+        condition: str | None,
+        columns: list[list[Any]],
+    ) -> list[int]:
+        """Updates rows with a single statement joined on the list of their
+        values. Does not commit
+
+        :param table: Table of the rows, aliased ``t``
+        :param writes: SQL expression producing the new value of each column
+            from the values, available as ``v.<column>``
+        :param condition: Additional SQL condition on the rows, without alias
+        :param columns: DB ids of the rows, then the values of each column of ``writes``
+        :return: DB ids of the rows updated
+        """
+
+
+class PostgresBackend(Backend):
+    def __init__(self, target: dict[str, Any]):
+        """Connects to the DB
+
+        :param target: Connection parameters of the DB, see ``utils.get_db_targets``
+        """
+        # Only loaded by the commands that connect to a DB
+        import psycopg2 as pcg
+        self.connection = pcg.connect(**{key: val for key, val in target.items() if key != 'backend'})
+        self.port = self.connection.info.port
+        # Names of the statements prepared on the connection
+        self._prepared: set[str] = set()
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.connection.closed)
+
+    def is_alive(self) -> bool:
+        import psycopg2 as pcg
+        if self.connection.closed:
+            return False
+        try:
+            if self.connection.info.transaction_status != pcg.extensions.TRANSACTION_STATUS_IDLE:
+                self.connection.rollback()
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except pcg.Error:
+            return False
+        return True
+
+    def digest(self, value: Any) -> str | None:
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        return super().digest(value)
+
+    def _execute(self, query: str, types: list[str], params: list[Any]) -> list[tuple]:
+        """Executes a query with bound parameters (``$1``, ``$2``…), as a
+        statement prepared once per connection and set of parameter types, so
+        the server only parses and plans it the first time
+
+        :param query: Query to execute
+        :param types: SQL types of the parameters
+        :param params: Values of the parameters, adapted by psycopg2
+        :return: Rows returned by the query
+        """
+        # The types are part of the statement: the same query can be sent
+        # arrays typed differently, e.g. a column of NULLs is sent as text[]
+        key = '\0'.join([query, *types])
+        name = f"serior_{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+        with self.connection.cursor() as cursor:
+            if name not in self._prepared:
+                cursor.execute(f"PREPARE {name}({', '.join(types)}) AS {query}")
+                self._prepared.add(name)
+            cursor.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params)
+            return cursor.fetchall()
+
+    def _select_ids(self, keys: list[tuple[str, str, str, str]]) -> list[tuple[str, str, int]]:
+        return self._execute("""
+            SELECT d.model, x.xml_id, d.res_id
+            FROM ir_model_data AS d
+            JOIN unnest($1, $2, $3, $4) AS x(module, name, model, xml_id)
+                ON d.module = x.module AND d.name = x.name AND d.model = x.model
+        """, ['text[]'] * 4, [list(column) for column in zip(*keys)] if keys else [[]] * 4)
+
+    def digests(
+        self,
+        table: str,
+        reads: dict[str, str],
+        condition: str | None,
+        ids: list[int],
+    ) -> dict[int, dict[str, str | None] | None]:
+        rows = self._execute(f"""
+            SELECT id, {f"({condition}) IS TRUE" if condition else 'true'},
+                {', '.join(f"md5(({expr})::text)" for expr in reads.values())}
+            FROM {table}
+            WHERE id = ANY($1)
+        """, ['integer[]'], [ids])
+        return {id: dict(zip(reads, values)) if included else None for id, included, *values in rows}
+
+    def update(
+        self,
+        table: str,
+        writes: dict[str, str],
+        condition: str | None,
+        columns: list[list[Any]],
+    ) -> list[int]:
+        assignments = ', '.join(f"{name} = {expr}" for name, expr in writes.items())
+        # Values are sent as one array per column, the statement doesn't
+        # depend on the number of rows
+        arrays = ', '.join(f"${i}" for i in range(1, len(columns) + 1))
+        rows = self._execute(f"""
+            UPDATE {table} AS t
+            SET {assignments}
+            FROM unnest({arrays}) AS v(record_id, {', '.join(writes)})
+            WHERE t.id = v.record_id {f"AND t.{condition}" if condition else ''}
+            RETURNING t.id
+        """, [_array_type(column) for column in columns], columns)
+        return [id for id, in rows]
+
+
+def _array_type(values: list[Any]) -> str:
+    """SQL type of an array of injected values"""
+    if all(isinstance(value, bool) for value in values):
+        return 'boolean[]'
+    if all(isinstance(value, int) for value in values):
+        return 'integer[]'
+    return 'text[]'
+
+
+class SqliteBackend(Backend):
+    # Columns set by the injection of the Odoo tables. Created if missing
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ir_model_data (
+            id integer PRIMARY KEY, module text, name text, model text, res_id integer
+        );
+        CREATE INDEX IF NOT EXISTS ir_model_data_key ON ir_model_data (module, name, model);
+        CREATE TABLE IF NOT EXISTS ir_ui_view_ionic (
+            id integer PRIMARY KEY, raw_architecture text, architecture text,
+            is_translatable_architecture boolean
+        );
+        CREATE TABLE IF NOT EXISTS manual_onchange (
+            id integer PRIMARY KEY, raw_code text, code text, is_translatable_code boolean
+        );
+        CREATE TABLE IF NOT EXISTS ir_ui_css_ionic (id integer PRIMARY KEY, style text);
+        CREATE TABLE IF NOT EXISTS ir_ui_menu_ionic_label (id integer PRIMARY KEY, value text);
+        CREATE TABLE IF NOT EXISTS ir_ui_menu_ionic_param (
+            id integer PRIMARY KEY, value text, is_synchronized boolean DEFAULT true
+        );
+    """
+
+    def __init__(self, target: dict[str, Any]):
+        """Opens the DB file, ``:memory:`` for a DB living as long as the connection
+
+        :param target: Connection parameters of the DB, see ``utils.get_db_targets``.
+            The name of the DB is the path of its file
+        """
+        # Used by the threads of successive injections, never by two at once
+        self.connection = sqlite3.connect(target['database'], check_same_thread=False)
+        self.connection.create_function('md5', 1, self.digest, deterministic=True)
+        self.connection.executescript(self.SCHEMA)
+        self._closed = False
+
+    @staticmethod
+    def describe(target: dict[str, Any]) -> str:
+        return f"sqlite:{target['database']}"
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def is_alive(self) -> bool:
+        if self._closed:
+            return False
+        try:
+            self.connection.rollback()
+            self.connection.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def close(self) -> None:
+        self.connection.close()
+        self._closed = True
+
+    def digest(self, value: Any) -> str | None:
+        # Booleans are stored as integers
+        if isinstance(value, bool):
+            value = int(value)
+        return super().digest(value)
+
+    def seed(self, module: str, records: list["Record"]) -> int:
+        """Creates empty rows for the records absent from the DB, found by
+        their xml_id, so they can be injected into. Commits
+
+        :param module: Module of the scenario
+        :param records: Records of any type
+        :return: Number of rows created
+        """
+        ids = self.resolve_ids(module, records)
+        absent = [rc for rc in records if rc.xml_id not in ids.get(rc._xml_model, {})]
+        for rc in absent:
+            row_id = self.connection.execute(f"INSERT INTO {rc._table} DEFAULT VALUES").lastrowid
+            rc_module, _, name = rc.xml_id.rpartition('.')
+            self.connection.execute(
+                "INSERT INTO ir_model_data (module, name, model, res_id) VALUES (?, ?, ?, ?)",
+                (rc_module or module, name, rc._xml_model, row_id))
+        self.connection.commit()
+        return len(absent)
+
+    @staticmethod
+    def _unpack(alias: str, names: tuple[str, ...] | list[str]) -> str:
+        """Common table expression turning the JSON array of rows bound as
+        parameter into a table with the given columns, for lack of ``unnest``.
+        It is materialized: the rows are extracted once, then joined through
+        the indexes of the other table, instead of being extracted again for
+        each of its rows
+
+        :param alias: Name of the table
+        :param names: Names of its columns
+        """
+        fields = ', '.join(f"json_extract(value, '$[{i}]') AS {name}" for i, name in enumerate(names))
+        return f"WITH {alias} AS MATERIALIZED (SELECT {fields} FROM json_each(?))"
+
+    def _select_ids(self, keys: list[tuple[str, str, str, str]]) -> list[tuple[str, str, int]]:
+        return self.connection.execute(f"""
+            {self._unpack('x', ['module', 'name', 'model', 'xml_id'])}
+            SELECT d.model, x.xml_id, d.res_id
+            FROM x
+            JOIN ir_model_data AS d
+                ON d.module = x.module AND d.name = x.name AND d.model = x.model
+        """, (json.dumps(keys),)).fetchall()
+
+    def digests(
+        self,
+        table: str,
+        reads: dict[str, str],
+        condition: str | None,
+        ids: list[int],
+    ) -> dict[int, dict[str, str | None] | None]:
+        rows = self.connection.execute(f"""
+            SELECT id, {f"({condition}) IS TRUE" if condition else 'true'},
+                {', '.join(f"md5({expr})" for expr in reads.values())}
+            FROM {table}
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(ids),)).fetchall()
+        return {id: dict(zip(reads, values)) if included else None for id, included, *values in rows}
+
+    def update(
+        self,
+        table: str,
+        writes: dict[str, str],
+        condition: str | None,
+        columns: list[list[Any]],
+    ) -> list[int]:
+        assignments = ', '.join(f"{name} = {expr}" for name, expr in writes.items())
+        rows = self.connection.execute(f"""
+            {self._unpack('v', ['record_id', *writes])}
+            UPDATE {table} AS t
+            SET {assignments}
+            FROM v
+            WHERE t.id = v.record_id {f"AND t.{condition}" if condition else ''}
+            RETURNING id
+        """, (json.dumps(list(zip(*columns))),)).fetchall()
+        return [id for id, in rows]
+
+
+BACKENDS: dict[str, type[Backend]] = {
+    'postgres': PostgresBackend,
+    'sqlite': SqliteBackend,
+}
@@ -0,0 +1,169 @@
+"""On-disk state of the builds:
+- cache of the records' XML fragments, allowing builds to only serialize the
+  records that changed since the previous one
+- manifest of the built files, allowing builds to leave untouched the files
+  whose content didn't change
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Callable
+
+# Bump whenever the XML output of a model changes, to discard stale fragments
+CACHE_VERSION = 1
+MANIFEST_VERSION = 1
+
+
+class FragmentCache:
+    """Fragments are keyed by a hash of everything their serialization depends
+    on: the type of the record, the prefix of the scenario, the record's entry
+    in the skeleton and the content of its code file.
+    Fragments that weren't requested since the cache was loaded are dropped
+    when it is saved, so the file doesn't grow with every edit.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the cache file. Created on save if needed
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._used: dict[str, str] = {}
+        try:
+            with open(path, 'r') as file:
+                content = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            content = {}
+
+        if content.get('version') == CACHE_VERSION:
+            self._fragments: dict[str, str] = content.get('fragments', {})
+        else:
+            self._fragments = {}
+
+    @staticmethod
+    def key(model: type, entry: dict[str, Any], prefix: str = '', code_file: str | None = None) -> str:
+        """Computes the key of a record's fragment
+
+        :param model: Class of the record
+        :param entry: Entry of the record in the skeleton
+        :param prefix: Prefix of the scenario
+        :param code_file: Path to the code file of the record, if any
+        :return: Hex digest identifying the fragment
+        """
+        digest = hashlib.sha1(
+            json.dumps([model.__name__, prefix, entry], sort_keys=True, default=str).encode()
+        )
+        if code_file:
+            with open(code_file, 'rb') as file:
+                digest.update(file.read())
+        return digest.hexdigest()
+
+    def get(self, key: str, serialize: Callable[[], str]) -> str:
+        """Fetches a fragment, serializing the record on cache misses
+
+        :param key: Key of the fragment, see ``key``
+        :param serialize: Produces the fragment if it isn't cached
+        :return: The XML fragment of the record
+        """
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            fragment = serialize()
+        else:
+            self.hits += 1
+        self._used[key] = fragment
+        return fragment
+
+    def save(self) -> None:
+        """Writes the fragments used since loading back to disk, if anything changed"""
+        if not self.misses and self._used.keys() == self._fragments.keys():
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written aside then renamed, an interrupted build mustn't corrupt the cache
+        with open(f"{self.path}.tmp", 'w') as file:
+            json.dump({'version': CACHE_VERSION, 'fragments': self._used}, file)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class Manifest:
+    """Content hashes of the built files and of each of their records, as of
+    the last build. The size and modification time of the files are kept
+    along, to notice files that were modified by something else since
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the manifest file. Created on save if needed
+        """
+        self.path = path
+        try:
+            with open(path, 'r') as file:
+                content = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            content = {}
+
+        if content.get('version') == MANIFEST_VERSION:
+            self._files: dict[str, dict[str, Any]] = content.get('files', {})
+        else:
+            self._files = {}
+
+    def is_current(self, path: str, digest: str) -> bool:
+        """Checks whether the file on disk already has the given content. The
+        file is only read if it was modified since it was last built
+
+        :param path: Path of the built file
+        :param digest: Hash of the content the file should have
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        entry = self._files.get(path)
+        if entry and (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime_ns']):
+            return entry['digest'] == digest
+
+        with open(path, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest() == digest
+
+    def diff_records(self, path: str, records: dict[str, str]) -> tuple[list[str], list[str], list[str]]:
+        """Compares the records of a file with those of its last build
+
+        :param path: Path of the built file
+        :param records: Hash of the fragment of each record, by name
+        :return: Names of the added, changed and removed records
+        """
+        previous: dict[str, str] = self._files.get(path, {}).get('records', {})
+        added = [name for name in records if name not in previous]
+        changed = [name for name, digest in records.items() if previous.get(name, digest) != digest]
+        removed = [name for name in previous if name not in records]
+        return added, changed, removed
+
+    def update(self, path: str, digest: str, records: dict[str, str]) -> None:
+        """Records the content of a built file
+
+        :param path: Path of the built file
+        :param digest: Hash of the content of the file
+        :param records: Hash of the fragment of each record, by name
+        """
+        stat = os.stat(path)
+        self._files[path] = {
+            'digest': digest,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'records': records,
+        }
+
+    def save(self) -> None:
+        """Writes the manifest to disk"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.tmp", 'w') as file:
+            json.dump({'version': MANIFEST_VERSION, 'files': self._files}, file, indent=1)
+        os.replace(f"{self.path}.tmp", self.path)
@@ -1,40 +1,48 @@
 from . import param
+from .backend import Backend
+from .writer import FileWriter
 from typing import Any, TYPE_CHECKING
-import json
 
 class Label(param.Param):
+    # Same layout & columns as params, under another model
+    _xml_model = 'ir.ui.menu.ionic.label'
+    _table = 'ir_ui_menu_ionic_label'
+    _db_filter = None
     if TYPE_CHECKING:
         xml_id: str
         name: str
         value: str
 
-    def to_dict(self, prefix) -> dict[str, Any]:
+    def to_dict(self, prefix, writer: FileWriter | None = None) -> dict[str, Any]:
         """Transforms the record into a dictionary, omitting as many values as
         possible (values that are the same as the defaults are skipped)"""
-        vals = super().to_dict(prefix)
+        vals = super().to_dict(prefix, writer)
         del vals['note']
         return vals
 
-    def to_xml(self, prefix: str) -> str:
-        """Transforms the record into a string of its XML serialization, omitting
-        superfluous values
-        """
-        return super().to_xml(prefix).replace('ir.ui.menu.ionic.param', 'ir.ui.menu.ionic.label')
+    @staticmethod
+    def _is_v10(backend: Backend, v10_port=5416) -> bool:
+        """Labels are translated jsonb values in the v10 DB"""
+        return backend.port == v10_port
 
-    def inject(self, cursor: Any, v10_port=5416) -> None:
-        """Injects label's value in the DB. Does not commit
-        TODO: Filter on xml id. It would overwrite ALL labels with this name
+    @classmethod
+    def _db_reads(cls, backend: Backend) -> dict[str, str]:
+        """SQL expressions reading back the value of each column that can be
+        set by the injection
 
-        :param cursor: Database cursor
+        :param backend: Backend of the DB
         """
-        value = self.value.replace("'", "''")
-        if cursor.connection.info.port == v10_port:
-            value = f"""jsonb_set(value, '{{en_US}}', '{json.dumps(value)}', false)"""
-        else:
-            value = f"'{value}'"
+        if cls._is_v10(backend):
+            return {'value': "value->>'en_US'"}
+        return super()._db_reads(backend)
+
+    @classmethod
+    def _db_writes(cls, backend: Backend) -> dict[str, str]:
+        """SQL expressions producing the new value of each column from the
+        injected values
 
-        cursor.execute(f"""
-            UPDATE ir_ui_menu_ionic_label
-            SET value = {value}
-            WHERE name = '{self.name}'
-        """)
+        :param backend: Backend of the DB
+        """
+        if cls._is_v10(backend):
+            return {'value': "jsonb_set(t.value, '{en_US}', to_jsonb(v.value), false)"}
+        return super()._db_writes(backend)
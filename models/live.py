@@ -0,0 +1,165 @@
+"""In-memory model of a project, kept by watch mode across saves.
+
+The scenario, its records and their XML fragments are built once. On each
+save, only the records affected by the saved files are rebuilt: the record of
+a code file, or the records whose entry changed in the skeleton. Build and
+inject then run from the model instead of reloading the whole project.
+"""
+
+import copy
+import os
+from typing import Any
+from .record import Record
+from .onchange import Onchange
+from .view import View
+from .style import Style
+from .label import Label
+from .param import Param
+from .scenario import Scenario
+from . import utils
+
+# Skeleton keys of the records, in the order of the data file. The scenario
+# comes after the styles
+RECORD_KEYS: list[tuple[str, type[Record]]] = [
+    ('onchanges', Onchange),
+    ('views', View),
+    ('styles', Style),
+    ('labels', Label),
+    ('params', Param),
+]
+
+
+class LiveModel:
+    """Records are named ``<skeleton key>/<id>``, the scenario by its prefix,
+    as in the reports of the build"""
+
+    def __init__(self):
+        self.skeleton: dict[str, Any] | None = None
+        self.prefix = ''
+        # Model and skeleton entry of each record, in the order of the data file
+        self._entries: dict[str, tuple[type[Record], dict[str, Any]]] = {}
+        # Name of the record of each code file
+        self._code_files: dict[str, str] = {}
+        # Built on demand, dropped when their sources change
+        self._records: dict[str, Record] = {}
+        self._fragments: dict[str, str] = {}
+
+    def update(self, changed: set[str] | None = None) -> set[str]:
+        """Brings the model up to date with the saved files
+
+        :param changed: Files saved since the last update. None to reload the
+            skeleton, as if it were saved
+        :return: Names of the records to bring up to date: those of the saved
+            code files, or all of them when the skeleton was saved, since its
+            other keys (``db``, ``module``, ``config``) decide where they go
+        """
+        affected = set()
+        if self.skeleton is None or changed is None or 'skeleton.yaml' in changed:
+            self._load_skeleton(utils.load_skeleton('skeleton.yaml'))
+            if changed is None or 'skeleton.yaml' in changed:
+                affected |= set(self._entries)
+
+        for filename in changed or ():
+            name = self._code_files.get(filename)
+            if name is not None:
+                self._invalidate(name)
+                affected.add(name)
+        return affected
+
+    def _load_skeleton(self, skeleton: dict[str, Any]) -> None:
+        """Replaces the skeleton, dropping the records whose entry changed
+
+        :param skeleton: New content of the skeleton
+        """
+        entries = {}
+        for key, model in RECORD_KEYS:
+            for entry in skeleton.get(key) or []:
+                entries[f"{key}/{entry['id']}"] = (model, entry)
+
+        if skeleton['prefix'] != self.prefix:
+            # The ids of every record depend on it
+            modified = set(self._entries) | set(entries) | {self.prefix, skeleton['prefix']}
+        else:
+            modified = {
+                name for name in set(self._entries) | set(entries)
+                if self._entries.get(name) != entries.get(name)
+            }
+            # The scenario depends on the whole skeleton
+            if skeleton != self.skeleton:
+                modified.add(self.prefix)
+        modified.discard('')
+
+        for name in modified:
+            self._invalidate(name)
+        self.skeleton = skeleton
+        self.prefix = skeleton['prefix']
+        self._entries = entries
+        self._code_files = {}
+        for name, (model, entry) in entries.items():
+            code_file = model.code_file(entry['id'])
+            if code_file:
+                self._code_files[code_file] = name
+
+    def _invalidate(self, name: str) -> None:
+        """Drops the record and fragment of a name, to be rebuilt from their sources"""
+        self._records.pop(name, None)
+        self._fragments.pop(name, None)
+
+    def record(self, name: str) -> Record:
+        """Record of a name, rebuilt from the skeleton and its code file if needed
+
+        :param name: Name of the record, or prefix for the scenario
+        """
+        record = self._records.get(name)
+        if record is None:
+            if name == self.prefix:
+                # Rebuilding the scenario extends the lists of the skeleton
+                record = Scenario.from_dict(copy.deepcopy(self.skeleton))
+            else:
+                model, entry = self._entries[name]
+                record = model.from_dict(entry, self.prefix)
+            self._records[name] = record
+        return record
+
+    def records(self, names: set[str] | None = None) -> list[list[Record]]:
+        """Records other than the scenario, grouped by type
+
+        :param names: Names of the records. All of them if None, names that
+            aren't records anymore are ignored
+        :return: The records, grouped by type in the order of the data file
+        """
+        groups: dict[type, list[Record]] = {model: [] for _, model in RECORD_KEYS}
+        for name, (model, _) in self._entries.items():
+            if names is None or name in names:
+                groups[model].append(self.record(name))
+        return list(groups.values())
+
+    def fragments(self) -> list[tuple[str, str]]:
+        """XML fragments of every record, in the order of the data file. Only
+        those of rebuilt records are serialized again
+
+        :return: Name and fragment of each record
+        """
+        names = list(self._entries)
+        # The scenario goes between the styles and the labels
+        position = next((i for i, name in enumerate(names) if name.startswith(('labels/', 'params/'))), len(names))
+        names.insert(position, self.prefix)
+
+        fragments = []
+        for name in names:
+            fragment = self._fragments.get(name)
+            if fragment is None:
+                record = self.record(name)
+                # Labels and params reference the scenario
+                fragment = record.to_xml(self.prefix) if isinstance(record, Param) else record.to_xml()
+                self._fragments[name] = fragment
+            fragments.append((name, fragment))
+        return fragments
+
+
+# Models of the projects watched by the process, by directory
+_models: dict[str, LiveModel] = {}
+
+def get_model() -> LiveModel:
+    """Model of the project in the current directory, kept for the whole process"""
+    return _models.setdefault(os.getcwd(), LiveModel())
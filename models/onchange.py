@@ -1,4 +1,6 @@
 from . import record
+from . import serializer
+from .writer import FileWriter
 from lxml import etree
 from typing import Any, TYPE_CHECKING
 from collections.abc import Iterable
@@ -9,6 +11,9 @@ class Onchange(record.Record):
     secure: bool = True
     translatable = None
     model_id: str = 'manual.onchange'
+    _xml_model = 'manual.onchange'
+    _table = 'manual_onchange'
+    _db_columns = ('raw_code', 'code', 'is_translatable_code')
     if TYPE_CHECKING:
         code: str
         xml_id: str
@@ -18,10 +23,10 @@ class Onchange(record.Record):
         self._code_attr = code_field
         self._ext = ext
 
-    def to_dict(self, prefix) -> dict[str, Any]:
+    def to_dict(self, prefix, writer: FileWriter | None = None) -> dict[str, Any]:
         """Transforms the record into a dictionary, omitting as many values as
         possible (values that are the same as the defaults are skipped)"""
-        vals = super().to_dict(prefix, ['name'])
+        vals = super().to_dict(prefix, ['name'], writer)
 
         if vals['name'] == vals['id']:
             del vals['name']
@@ -82,19 +87,19 @@ class Onchange(record.Record):
             onchange.deprecated = cls.deprecated
         else:
             # Bool-wrapped because sometimes it's an int 🤡
-            onchange.deprecated = bool(eval(tmp.get('eval', 'False')))
+            onchange.deprecated = bool(record.eval_literal(tmp.get('eval', 'False')))
 
         tmp = node.find('field[@name="is_security_check"]')
         if tmp is None:
             onchange.secure = cls.secure
         else:
-            onchange.secure = bool(eval(tmp.get('eval', 'False')))
+            onchange.secure = bool(record.eval_literal(tmp.get('eval', 'False')))
 
         tmp = node.find('field[@name="is_translatable_code"]')
         if tmp is None:
             onchange.translatable = cls.translatable
         else:
-            intermediate = eval(tmp.get('eval'))
+            intermediate = record.eval_literal(tmp.get('eval'))
             if intermediate is not None:
                 onchange.translatable = bool(intermediate)
             else:
@@ -109,7 +114,7 @@ class Onchange(record.Record):
             if not model_str:
                 onchange.model_id = cls.model_id
             else:
-                value: Any | list[tuple[str, str, str]] = eval(model_str)
+                value: Any | list[tuple[str, str, str]] = record.eval_literal(model_str)
                 search_err_msg = f"L'onchange {onchange.xml_id} a un modèle d'une autre forme que \"[('model', '=', 'NOM.DU.MODÈLE')]\""
                 if not isinstance(value, Iterable) or len(value) != 1:
                     raise ValueError(search_err_msg)
@@ -119,33 +124,22 @@ class Onchange(record.Record):
 
         return onchange
 
-    def to_xml(self) -> str:
-        """Transforms the record into a string of its XML serialization, omitting
-        superfluous values
-        """
-        return '\n'.join(filter(lambda x: x is not None, [
-            f"""    <record id="{self.xml_id}" model="manual.onchange">""",
-            f"""        <field name="name">{self.name}</field>""",
-            f"""        <field name="model_id" search="[('model', '=', '{self.model_id}')]"/>""",
-            f"""        <field name="is_deprecated" eval="{self.deprecated}"/>""" if self.deprecated else None,
-            f"""        <field name="is_translatable_code" eval="{self.translatable}"/>""" if self.translatable is not None else None,
-            f"""        <field name="is_security_check" eval="{self.secure}"/>""" if not self.secure else None,
-            f"""        <field name="{'raw_' * self.raw}code"><![CDATA[""",
-            f"""{self.code.strip()}""",
-            f"""        ]]></field>""",
-            f"""    </record>""",
-            f"""""",
-        ]))
-
-    def inject(self, cursor: Any) -> None:
-        """Injects onchange's architecture in the DB. Does not commit
-
-        :param cursor: Database cursor
-        """
-        code = self.code.replace("'", "''")
-        cursor.execute(f"""
-            UPDATE manual_onchange
-            SET {'raw_' if self.raw else ''}code = '{code}',
-                is_translatable_code = '{bool(self.translatable)}'
-            WHERE name = '{self.name}'
-        """)
+    _serialize = serializer.compile_layout('Onchange', (
+        """    <record id="{self.xml_id}" model="{self._xml_model}">""",
+        """        <field name="name">{self.name}</field>""",
+        """        <field name="model_id" search="[('model', '=', '{self.model_id}')]"/>""",
+        ("""        <field name="is_deprecated" eval="{self.deprecated}"/>""", "self.deprecated"),
+        ("""        <field name="is_translatable_code" eval="{self.translatable}"/>""", "self.translatable is not None"),
+        ("""        <field name="is_security_check" eval="{self.secure}"/>""", "not self.secure"),
+        """        <field name="{'raw_' * self.raw}code"><![CDATA[""",
+        """{self.code.strip()}""",
+        """        ]]></field>""",
+        """    </record>""",
+    ), globals())
+
+    def _db_values(self) -> dict[str, Any]:
+        """Values of the columns set by the injection, as stored in the DB"""
+        return {
+            f"{'raw_' if self.raw else ''}code": self.code,
+            'is_translatable_code': bool(self.translatable),
+        }
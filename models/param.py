@@ -1,18 +1,24 @@
 from . import record
+from . import serializer
+from .writer import FileWriter
 from typing import Any, TYPE_CHECKING
 from collections.abc import Iterable
 
 class Param(record.Record):
     note: str = ''
+    _xml_model = 'ir.ui.menu.ionic.param'
+    _table = 'ir_ui_menu_ionic_param'
+    _db_columns = ('value',)
+    _db_filter = 'is_synchronized <> false'
     if TYPE_CHECKING:
         xml_id: str
         name: str
         value: str
 
-    def to_dict(self, prefix) -> dict[str, Any]:
+    def to_dict(self, prefix, writer: FileWriter | None = None) -> dict[str, Any]:
         """Transforms the record into a dictionary, omitting as many values as
         possible (values that are the same as the defaults are skipped)"""
-        vals = super().to_dict(prefix, [])
+        vals = super().to_dict(prefix, [], writer)
 
         if vals['name'] == vals['id']:
             del vals['name']
@@ -64,30 +70,15 @@ class Param(record.Record):
 
         return param
 
-    def to_xml(self, prefix: str) -> str:
-        """Transforms the record into a string of its XML serialization, omitting
-        superfluous values
-        """
-        return '\n'.join(filter(lambda x: x is not None, [
-            f"""    <record id="{self.xml_id}" model="ir.ui.menu.ionic.param">""",
-            f"""        <field name="name">{self.name}</field>""",
-            f"""        <field name="ionic_menu_id" eval="ref('{prefix}')"/>""",
-            f"""        <field name="value">{self.value}</field>""",
-            f"""        <field name="note">{self.note}</field>""" if self.note else None,
-            f"""    </record>""",
-            f"""""",
-        ]))
-
-    def inject(self, cursor: Any) -> None:
-        """Injects param's value in the DB. Does not commit
-        TODO: Filter on xml id. It would overwrite ALL params with this name
-
-        :param cursor: Database cursor
-        """
-        value = self.value.replace("'", "''")
-        cursor.execute(f"""
-            UPDATE ir_ui_menu_ionic_param
-            SET value = '{value}'
-            WHERE name = '{self.name}'
-                AND is_synchronized <> false
-        """)
+    _serialize = serializer.compile_layout('Param', (
+        """    <record id="{self.xml_id}" model="{self._xml_model}">""",
+        """        <field name="name">{self.name}</field>""",
+        """        <field name="ionic_menu_id" eval="ref('{prefix}')"/>""",
+        """        <field name="value">{self.value}</field>""",
+        ("""        <field name="note">{self.note}</field>""", "self.note"),
+        """    </record>""",
+    ), globals())
+
+    def _db_values(self) -> dict[str, Any]:
+        """Values of the columns set by the injection, as stored in the DB"""
+        return {'value': self.value}
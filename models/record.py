@@ -1,9 +1,13 @@
 from abc import abstractmethod
 import ast
+import os
 import re
-from functools import reduce
+from functools import cache, reduce
 from types import NoneType
 from typing import Any, Callable, Optional # Can't use self because python 3.10 🥲
+from .serializer import Serializer
+from .backend import Backend
+from .writer import FileWriter
 
 PREFIX_RE = re.compile(r'^([A-Z_]+)_')
 REF_RE = re.compile(r'ref\( *\'(.*?)\' *\)')
@@ -11,18 +15,25 @@ REF_RE = re.compile(r'ref\( *\'(.*?)\' *\)')
 def parse_refs(expr: str) -> list[str]:
     """Retrieves the name of the references by parsing the expression.
     Had I not been a golem, I'd have created a local ``ref`` identity function.
-    Oh well, too late, AST unraveling keeps you sharp I guess
+    Oh well, too late, AST unraveling keeps you sharp I guess.
+    Memoized, the same expressions come back across records and files
     """
+    return list(_parse_refs(expr))
+
+
+@cache
+def _parse_refs(expr: str) -> tuple[str, ...]:
+    """Memoized implementation of ``parse_refs``"""
     tree = ast.parse(expr)
     names = []
     if not tree.body:
-        return names
+        return ()
 
     root = tree.body[0]
     if not isinstance(root, ast.Expr):
-        return names
+        return ()
     elif not isinstance(root.value, (ast.List, ast.Tuple)):
-        return names
+        return ()
 
     for sub_expr in root.value.elts:
         command = sub_expr.elts[0].value
@@ -37,7 +48,24 @@ def parse_refs(expr: str) -> list[str]:
                         continue
                     names.append(call.args[0].value)
 
-    return names
+    return tuple(names)
+
+
+@cache
+def eval_literal(expr: str) -> Any:
+    """Evaluates the expression of an ``eval`` attribute, provided it's a
+    Python literal: booleans, None, numbers, strings, lists, tuples... Nothing
+    is executed, unlike with ``eval``. Memoized, data files repeat the same few
+    expressions thousands of times, so the result must not be modified
+
+    :param expr: Expression to evaluate
+    :return: Value of the expression
+    :raises ValueError: The expression isn't a literal
+    """
+    try:
+        return ast.literal_eval(expr.strip())
+    except (AttributeError, ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        raise ValueError(f"L'expression \"{expr}\" n'est pas une valeur littérale") from None
 
 
 def sanitize(text: str, reverse: bool = False, light: bool = False) -> str:
@@ -79,6 +107,11 @@ class Record:
     quirky: Optional[bool] = None # Flag for records whose id does not conform to the convention
     _ext: str # File extension associated with record type
     _code_attr: str # Name of the attribute which holds the record's code
+    _serialize: Serializer # XML layout of the record type, see ``serializer``
+    _xml_model: str # Model of the record type
+    _table: str # Table of the record type in the DB
+    _db_columns: tuple[str, ...] # Columns that can be set by the injection
+    _db_filter: Optional[str] = None # Additional SQL condition on the rows to inject into
 
     def __init(self):
         self._ext = None
@@ -102,12 +135,19 @@ class Record:
             val = getattr(self, field)
             setattr(self, field, val.replace(f"{prefix}_", ''))
 
-    def to_dict(self, prefix: str|None, prefixed_fields: list[str] = []) -> dict[str, Any]:
+    def to_dict(
+        self,
+        prefix: str|None,
+        prefixed_fields: list[str] = [],
+        writer: FileWriter | None = None,
+    ) -> dict[str, Any]:
         """Transforms the record into a dictionary, omitting as many values as
         possible.
         All attributes whose values are the class' default are omitted.
         Serializes the record's code into a file
         :param prefix: Prefix of the scenario
+        :param prefixed_fields: Fields (other than xml_id) to strip the prefix from
+        :param writer: Writes the code file, if it changed. Written right away otherwise
         """
         # Get all defaults ATTRIBUTES of the class. Prune methods & stuff
         class_defaults = self.__class__.__dict__.copy()
@@ -121,7 +161,7 @@ class Record:
 
         if prefix is not None:
             self.__remove_prefix(prefix, prefixed_fields)
-        self.__separate_code()
+        self.__separate_code(writer)
         vals = {'id': None} # Key-orderding trick. Nicer yaml output
         vals.update(self.__dict__.copy())
         for key, class_val in class_defaults.items():
@@ -140,16 +180,58 @@ class Record:
 
         return vals
 
-    def __separate_code(self) -> None:
+    def __separate_code(self, writer: FileWriter | None = None) -> None:
         """Outputs the record's code into a file and removes the 
         corresponding attribute
+
+        :param writer: Writes the file, if it changed. Written right away otherwise
         """
         if not getattr(self, '_ext', None):
             return
 
-        with open(f"{self.xml_id}.{self._ext}", 'w') as file:
+        path = f"{self.xml_id}.{self._ext}"
+        spilled = getattr(self, '_spilled', None)
+        if spilled is not None:
+            if writer is not None:
+                writer.move(spilled, path)
+            else:
+                os.replace(spilled, path)
+            return
+
+        code = getattr(self, self._code_attr).strip()
+        if writer is not None:
+            writer.write(path, code)
+        else:
+            with open(path, 'w') as file:
+                _ = file.write(code)
+        delattr(self, self._code_attr)
+
+    def spill_code(self) -> str | None:
+        """Outputs the record's code into a temporary file right away and
+        removes the corresponding attribute, so the code isn't held in memory.
+        The file is renamed to the record's once its final id is known, by ``to_dict``
+
+        :return: Path of the temporary file, None if the record has no code
+        """
+        if not getattr(self, '_ext', None):
+            return None
+
+        self._spilled = f".{self.xml_id}.{self._ext}.tmp"
+        with open(self._spilled, 'w') as file:
             _ = file.write(getattr(self, self._code_attr).strip())
         delattr(self, self._code_attr)
+        return self._spilled
+
+    @classmethod
+    def code_file(cls, id: str) -> str | None:
+        """Path to the file holding the code of a record, if its type has one
+
+        :param id: shortened id of the record
+        """
+        ext = getattr(cls(), '_ext', None)
+        if not ext:
+            return None
+        return f"{id}.{ext}"
 
     def _incorporate_code(self, id: str) -> None:
         """Fetches the records code from its file and sets the correspoding
@@ -176,12 +258,97 @@ class Record:
         possible"""
         pass
 
-    @abstractmethod
-    def to_xml(self) -> str:
+    def to_xml(self, prefix: str | None = None) -> str:
         """Transforms the record into a string of its XML serialization, omitting
         superfluous values
+
+        :param prefix: Prefix of the scenario, for records referencing it
         """
-        pass
+        buffer: list[str] = []
+        self._serialize(buffer.append, prefix)
+        return ''.join(buffer)
+
+    @abstractmethod
+    def _db_values(self) -> dict[str, Any]:
+        """Values of the columns set by the injection, as stored in the DB"""
+
+    @classmethod
+    def _db_reads(cls, backend: Backend) -> dict[str, str]:
+        """SQL expressions reading back the value of each column that can be
+        set by the injection
+
+        :param backend: Backend of the DB
+        """
+        return {column: column for column in cls._db_columns}
+
+    @classmethod
+    def _db_writes(cls, backend: Backend) -> dict[str, str]:
+        """SQL expressions producing the new value of each column from the
+        injected values, available as ``v.<column>``. The row updated is ``t``
+
+        :param backend: Backend of the DB
+        """
+        return {column: f"v.{column}" for column in cls._db_columns}
+
+    @classmethod
+    def bulk_inject(cls, backend: Backend, records: list["Record"], ids: dict[str, int]) -> list[int]:
+        """Injects records of this type in the DB with a single UPDATE joined
+        on the list of their values, per set of columns. Does not commit
+
+        :param backend: Backend of the DB
+        :param records: Records to inject, all present in ``ids``
+        :param ids: DB ids of the records of this type, by xml_id
+        :return: DB ids of the rows updated
+        """
+        # Records of the same type can set different columns (raw or not)
+        groups: dict[tuple[str, ...], list[list[Any]]] = {}
+        for rc in records:
+            values = rc._db_values()
+            columns = groups.setdefault(tuple(values), [[] for _ in range(len(values) + 1)])
+            for column, value in zip(columns, (ids[rc.xml_id], *values.values())):
+                column.append(value)
+
+        writes = cls._db_writes(backend)
+        updated = []
+        for names, columns in groups.items():
+            updated.extend(backend.update(
+                cls._table, {name: writes[name] for name in names}, cls._db_filter, columns))
+        return updated
+
+    @classmethod
+    def outdated(
+        cls,
+        backend: Backend,
+        records: list["Record"],
+        ids: dict[str, int],
+    ) -> tuple[list["Record"], list["Record"], list["Record"]]:
+        """Compares records of this type with their rows in the DB. Only
+        digests of the columns are fetched, in a single query
+
+        :param backend: Backend of the DB
+        :param records: Records to compare
+        :param ids: DB ids of the records of this type, by xml_id
+        :return: The records whose rows differ, those without rows, and those
+            whose rows are excluded by ``_db_filter``
+        """
+        rows = backend.digests(cls._table, cls._db_reads(backend), cls._db_filter,
+                               [ids[rc.xml_id] for rc in records if rc.xml_id in ids])
+
+        outdated, missing, excluded = [], [], []
+        for rc in records:
+            id = ids.get(rc.xml_id)
+            if id not in rows:
+                missing.append(rc)
+                continue
+            row = rows[id]
+            if row is None:
+                excluded.append(rc)
+                continue
+            local = {column: backend.digest(value) for column, value in rc._db_values().items()}
+            if any(row[column] != digest for column, digest in local.items()):
+                outdated.append(rc)
+
+        return outdated, missing, excluded
 
     @staticmethod
     def get_ref(node: Any) -> str:
@@ -4,6 +4,7 @@ Does NOT handle the case of modifications of external scenarios
 """
 
 from . import record
+from . import serializer
 from typing import Any, TYPE_CHECKING, Optional
 
 class Scenario(record.Record):
@@ -12,6 +13,7 @@ class Scenario(record.Record):
     parent: Optional[str] = None
     help: Optional[str] = None
     init_oc: str = ''
+    _xml_model = 'ir.ui.menu.ionic'
     if TYPE_CHECKING:
         xml_id: str
         file_name: str # Allow handling of cases where xml_id doesn't reflect data file name
@@ -40,18 +42,19 @@ class Scenario(record.Record):
         # are insert-order--ordered now
         vals = {'prefix': self.xml_id}
         # Strips prefix from oc/views/styles. Further pruning to distinguish
-        # between external/here-defined entries is required
+        # between external/here-defined entries is required. Order of the data
+        # file, so that unravelling it again gives the same skeleton
         suffix = lambda x: x.replace(f'{self.xml_id}_', '')
 
-        other_onchanges = [suffix(record) for record in set(self.onchanges) - set(new_onchanges)]
+        other_onchanges = [suffix(record) for record in dict.fromkeys(self.onchanges) if record not in new_onchanges]
         if other_onchanges:
             vals['other_onchanges'] = other_onchanges
 
-        other_views = [suffix(record) for record in set(self.views) - set(new_views)]
+        other_views = [suffix(record) for record in dict.fromkeys(self.views) if record not in new_views]
         if other_views:
             vals['other_views'] = other_views
 
-        other_styles = [suffix(record) for record in set(self.styles) - set(new_styles)]
+        other_styles = [suffix(record) for record in dict.fromkeys(self.styles) if record not in new_styles]
         if other_styles:
             vals['other_styles'] = other_styles
 
@@ -147,12 +150,12 @@ class Scenario(record.Record):
         tmp = node.find('field[@name="sequence"]')
         if tmp is None:
             raise ValueError(f'{err_msg} "sequence"')
-        menu.sequence = eval(tmp.get('eval'))
+        menu.sequence = record.eval_literal(tmp.get('eval'))
 
         tmp = node.find('field[@name="sequence"]')
         if tmp is None:
             raise ValueError(f'{err_msg} "sequence"')
-        menu.sequence = eval(tmp.get('eval'))
+        menu.sequence = record.eval_literal(tmp.get('eval'))
 
         tmp = node.find('field[@name="view_id"]')
         if tmp is None:
@@ -163,13 +166,13 @@ class Scenario(record.Record):
         if tmp is None:
             menu.no_cache = cls.no_cache
         else:
-            menu.no_cache = bool(eval(tmp.get('eval', 'False')))
+            menu.no_cache = bool(record.eval_literal(tmp.get('eval', 'False')))
 
         tmp = node.find('field[@name="is_deprecated"]')
         if tmp is None:
             menu.deprecated = cls.deprecated
         else:
-            menu.deprecated = bool(eval(tmp.get('eval', 'False')))
+            menu.deprecated = bool(record.eval_literal(tmp.get('eval', 'False')))
 
         tmp = node.find('field[@name="parent_id"]')
         if tmp is None:
@@ -212,24 +215,19 @@ class Scenario(record.Record):
 
         return menu
 
-    def to_xml(self) -> str:
-        """Transforms the record into a string of its XML serialization, omitting
-        superfluous values
-        """
-        return '\n'.join(filter(lambda x: x is not None, [
-            f"""    <record id="{self.xml_id}" model="ir.ui.menu.ionic">""",
-            f"""        <field name="name">{self.name}</field>""",
-            f"""        <field name="icon" type="char">{self.icon}</field>""",
-            f"""        <field name="is_deprecated" eval="{self.deprecated}"/>""" if self.deprecated is not None else None,
-            f"""        <field name="parent_id" ref="{self.parent}"/>""" if self.parent is not None else None,
-            f"""        <field name="is_always_new" eval="{self.no_cache}"/>""" if self.no_cache is not None else None,
-            f"""        <field name="sequence" eval="{self.seq}"/>""",
-            f"""        <field name="view_id" ref="{self.main_view}"/>""",
-            f"""        <field name="initial_onchange_id" ref="{self.init_oc}"/>""" if self.init_oc else None,
-            f"""        <field name="view_ids" eval="[(6, 0, [{record.make_refs(self.views)}])]"/>""" if self.views else None,
-            f"""        <field name="css_ids" eval="[(6, 0, [{record.make_refs(self.styles)}])]"/>""" if self.styles else None,
-            f"""        <field name="onchange_ids" eval="[(6, 0, [{record.make_refs(self.onchanges)}])]"/>""" if self.onchanges else None,
-            f"""        <field name="help">{self.help}</field>""" if self.help else None,
-            f"""    </record>""",
-            f"""""",
-        ]))
+    _serialize = serializer.compile_layout('Scenario', (
+        """    <record id="{self.xml_id}" model="{self._xml_model}">""",
+        """        <field name="name">{self.name}</field>""",
+        """        <field name="icon" type="char">{self.icon}</field>""",
+        ("""        <field name="is_deprecated" eval="{self.deprecated}"/>""", "self.deprecated is not None"),
+        ("""        <field name="parent_id" ref="{self.parent}"/>""", "self.parent is not None"),
+        ("""        <field name="is_always_new" eval="{self.no_cache}"/>""", "self.no_cache is not None"),
+        """        <field name="sequence" eval="{self.seq}"/>""",
+        """        <field name="view_id" ref="{self.main_view}"/>""",
+        ("""        <field name="initial_onchange_id" ref="{self.init_oc}"/>""", "self.init_oc"),
+        ("""        <field name="view_ids" eval="[(6, 0, [{record.make_refs(self.views)}])]"/>""", "self.views"),
+        ("""        <field name="css_ids" eval="[(6, 0, [{record.make_refs(self.styles)}])]"/>""", "self.styles"),
+        ("""        <field name="onchange_ids" eval="[(6, 0, [{record.make_refs(self.onchanges)}])]"/>""", "self.onchanges"),
+        ("""        <field name="help">{self.help}</field>""", "self.help"),
+        """    </record>""",
+    ), globals())
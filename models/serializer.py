@@ -0,0 +1,56 @@
+"""Precompiled XML serialization of the records.
+
+Each record type declares the layout of its XML once, as a sequence of lines.
+A line is a template with the syntax of an f-string, in which ``self`` is the
+record and ``prefix`` the prefix of the scenario. It can be paired with a
+condition, an expression deciding whether the line is output.
+
+The layout is compiled into a function writing the lines straight into an
+output buffer, without building and filtering intermediate lists.
+"""
+
+from typing import Any, Callable
+
+Line = str | tuple[str, str]
+Serializer = Callable[[Any, Callable[[str], Any], str | None], None]
+
+
+def compile_layout(name: str, lines: tuple[Line, ...], namespace: dict[str, Any]) -> Serializer:
+    """Compiles the layout of a record type into a serialization function
+
+    :param name: Name of the record type, for tracebacks
+    :param lines: Lines of the layout, each either a template or a pair of a
+        template and its condition
+    :param namespace: Globals available to the templates and conditions
+    :return: Function taking the record, the write callback of the buffer and
+        the prefix of the scenario
+    """
+    source = ['def serialize(self, write, prefix=None):']
+    # Consecutive unconditional lines are merged into a single write
+    pending: list[str] = []
+    for line in lines:
+        template, condition = (line, None) if isinstance(line, str) else line
+        if '"""' in template:
+            raise ValueError(f"Le gabarit de {name} ne peut pas contenir de triple guillemets : {template}")
+        if condition is None:
+            pending.append(template)
+            continue
+        if pending:
+            source.append(_write_statement(pending, 1))
+            pending = []
+        source.append(f"    if {condition}:")
+        source.append(_write_statement([template], 2))
+    if pending:
+        source.append(_write_statement(pending, 1))
+
+    scope = dict(namespace)
+    exec(compile('\n'.join(source), f"<layout {name}>", 'exec'), scope)
+    serialize = scope['serialize']
+    serialize.__qualname__ = f"{name}._serialize"
+    return serialize
+
+
+def _write_statement(templates: list[str], depth: int) -> str:
+    """Produces the statement writing the given templates, one per line"""
+    content = ''.join(f"{template}\\n" for template in templates)
+    return f'{"    " * depth}write(f"""{content}""")'
@@ -1,9 +1,14 @@
 from . import record
+from . import serializer
+from .writer import FileWriter
 from typing import Any, TYPE_CHECKING
 from collections.abc import Iterable
 
 class Style(record.Record):
     pages: list = []
+    _xml_model = 'ir.ui.css.ionic'
+    _table = 'ir_ui_css_ionic'
+    _db_columns = ('style',)
     if TYPE_CHECKING:
         style: str
         xml_id: str
@@ -13,10 +18,10 @@ class Style(record.Record):
         self._code_attr = code_field
         self._ext = ext
 
-    def to_dict(self, prefix) -> dict[str, Any]:
+    def to_dict(self, prefix, writer: FileWriter | None = None) -> dict[str, Any]:
         """Transforms the record into a dictionary, omitting as many values as
         possible (values that are the same as the defaults are skipped)"""
-        vals = super().to_dict(prefix, ['name'])
+        vals = super().to_dict(prefix, ['name'], writer)
 
         if vals['name'] == vals['id']:
             del vals['name']
@@ -73,30 +78,17 @@ class Style(record.Record):
 
         return style
 
-    def to_xml(self) -> str:
-        """Transforms the record into a string of its XML serialization, omitting
-        superfluous values
-        """
-        return '\n'.join(filter(lambda x: x is not None, [
-            f"""    <record id="{self.xml_id}" model="ir.ui.css.ionic">""",
-            f"""        <field name="name">{self.name}</field>""",
-            f"""        <field name="page_ids" eval="[(6, 0, [{record.make_refs(self.pages)}])]"/>""" if self.pages else None,
-            f"""        <field name="style"><![CDATA[""",
-            f"""{self.style.strip()}""",
-            f"""        ]]></field>""",
-            f"""    </record>""",
-            f"""""",
-        ]))
-
-
-    def inject(self, cursor: Any) -> None:
-        """Injects css's architecture in the DB. Does not commit
-
-        :param cursor: Database cursor
-        """
-        style = self.style.replace("'", "''")
-        cursor.execute(f"""
-            UPDATE ir_ui_css_ionic
-            SET style = '{style}'
-            WHERE name = '{self.name}'
-        """)
+    _serialize = serializer.compile_layout('Style', (
+        """    <record id="{self.xml_id}" model="{self._xml_model}">""",
+        """        <field name="name">{self.name}</field>""",
+        ("""        <field name="page_ids" eval="[(6, 0, [{record.make_refs(self.pages)}])]"/>""", "self.pages"),
+        """        <field name="style"><![CDATA[""",
+        """{self.style.strip()}""",
+        """        ]]></field>""",
+        """    </record>""",
+    ), globals())
+
+
+    def _db_values(self) -> dict[str, Any]:
+        """Values of the columns set by the injection, as stored in the DB"""
+        return {'style': self.style}
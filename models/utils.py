@@ -1,7 +1,12 @@
+import io
 import os
-from time import sleep
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from time import sleep, perf_counter
 from typing import Any
-from psycopg2.extensions import connection
+from collections.abc import Iterator
 import yaml
 import models
 from .onchange import Onchange
@@ -10,13 +15,56 @@ from .style import Style
 from .label import Label
 from .param import Param
 from .scenario import Scenario
-import psycopg2 as pcg
+from .backend import Backend, BACKENDS
+from .writer import FileWriter
+
+
+def is_foreground() -> bool:
+    """Whether the process has the foreground of the terminal it outputs to.
+    Output that doesn't go to a terminal counts as foreground"""
+    try:
+        # Process' group and its stdout's group differ if run in background
+        return os.getpgrp() == os.tcgetpgrp(1)
+    except OSError:
+        return True
+
+
+@contextmanager
+def timed(phases: list[dict[str, Any]], name: str) -> Iterator[None]:
+    """Appends the name and duration of the enclosed phase to the list of phases"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        phases.append({'name': name, 'duration': perf_counter() - start})
+
+
+# Global config of the worker processes of ``fork_pool``
+worker_config: dict[str, Any] = {}
+
+def fork_pool(config: dict[str, Any]) -> ProcessPoolExecutor:
+    """Pool of worker processes forked from this one, so that they inherit
+    the imported modules instead of importing them again
+
+    :param config: Global config, available to the workers as ``worker_config``
+    """
+    return ProcessPoolExecutor(
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+        initargs=(config,),
+    )
+
+
+def _init_worker(config: dict[str, Any]) -> None:
+    """Stores the global config in the worker process"""
+    global worker_config
+    worker_config = config
 
 
 def reoarder_skeleton(skeleton: dict[str, Any]) -> dict:
     """Creates a skeleton with reordered keys, for ergonomy"""
     first_keys = [
-        'db', 'file_name', 'prefix', 'name', 'deprecated', 'icon',
+        'db', 'module', 'file_name', 'prefix', 'name', 'deprecated', 'icon',
         'sequence', 'main_view', 'quirky_main_view', 'init_oc',
         'quirky_init_oc'
     ]
@@ -44,47 +92,74 @@ def make_skeleton(
     labels: list[models.Label], # pyright: ignore[reportUnusedParameter]
     params: list[models.Param], # pyright: ignore[reportUnusedParameter]
     scenario: models.Scenario,
-):
+) -> dict[str, list[str]]:
+    """Writes the skeleton and the code files of the records. Files whose
+    content didn't change are left untouched, the others are written concurrently
+
+    :return: Paths of the files added, changed and left unchanged
+    """
     new_onchanges = [oc.xml_id for oc in onchanges]
     new_views = [view.xml_id for view in views]
     new_styles = [sheet.xml_id for sheet in styles]
-    structure = scenario.to_dict(new_onchanges, new_views, new_styles)
-    make_dict = lambda rcs: [rc.to_dict(scenario.xml_id) for rc in rcs]
-    for rec_type in ['styles', 'onchanges', 'views', 'labels', 'params']:
-        structure[rec_type] = make_dict(locals()[rec_type])
+    with FileWriter() as writer:
+        structure = scenario.to_dict(new_onchanges, new_views, new_styles)
+        make_dict = lambda rcs: [rc.to_dict(scenario.xml_id, writer) for rc in rcs]
+        for rec_type in ['styles', 'onchanges', 'views', 'labels', 'params']:
+            structure[rec_type] = make_dict(locals()[rec_type])
 
 
-    # If the file already exists and has been populated with unguessable data
-    # e.g. the db name for injection
-    if not os.path.exists(filename):
-        existing_vals = {} 
-    else:
-        with open(filename, 'r') as file:
-            existing_vals = yaml.full_load(file)
-    existing_vals.update(structure)
-    existing_vals = reoarder_skeleton(existing_vals)
+        # If the file already exists and has been populated with unguessable data
+        # e.g. the db name for injection
+        if not os.path.exists(filename):
+            existing_vals = {} 
+        else:
+            with open(filename, 'r') as file:
+                existing_vals = yaml.full_load(file)
+        existing_vals.update(structure)
+        existing_vals = reoarder_skeleton(existing_vals)
 
-    # TODO: Reuse file open for reading by resetting cursor and overwriting
-    with open(filename, 'w') as file:
-        config['yaml_dump'](existing_vals, file)
+        content = io.StringIO()
+        config['yaml_dump'](existing_vals, content)
+        writer.write(filename, content.getvalue())
 
+    return writer.report
 
-def rebuild_models(
-    filename: str
-) -> tuple[Scenario, list[Onchange], list[View], list[Style], list[Label], list[Param]]:
-    """Reconstructs models from skeleton file
+
+def load_skeleton(filename: str) -> dict[str, Any]:
+    """Reads the skeleton file
 
     :param filename: Path to skeleton file
-    :return: Tuple of the records
+    :return: Content of the skeleton
     """
     try:
         with open(filename, 'r') as file:
-            data = yaml.full_load(file)
+            return yaml.full_load(file)
     except FileNotFoundError:
+        # Some editors delete then recreate the file on save
         sleep(0.2)
         with open(filename, 'r') as file:
-            data = yaml.full_load(file)
+            return yaml.full_load(file)
+
 
+def rebuild_models(
+    filename: str
+) -> tuple[Scenario, list[Onchange], list[View], list[Style], list[Label], list[Param]]:
+    """Reconstructs models from skeleton file
+
+    :param filename: Path to skeleton file
+    :return: Tuple of the records
+    """
+    return models_from_skeleton(load_skeleton(filename))
+
+
+def models_from_skeleton(
+    data: dict[str, Any]
+) -> tuple[Scenario, list[Onchange], list[View], list[Style], list[Label], list[Param]]:
+    """Reconstructs models from the content of the skeleton, reading their code files
+
+    :param data: Content of the skeleton
+    :return: Tuple of the records
+    """
     scen = Scenario.from_dict(data)
 
     recompose = lambda x, data: __recompose(x, data, scen.xml_id)
@@ -114,19 +189,116 @@ def __recompose(model: Any, data: dict[str, Any], prefix: str) -> list[Any]:
     return [func(datum, prefix) for datum in data]
 
 
-def get_db_cursor(config: dict[str, Any]) -> pcg.extensions.cursor:
-    """Produces the cursor to connect to the configured DB
+# Connections are kept open between injections of a same process (watch mode),
+# as well as the parameters they were made with
+_db_targets: tuple[tuple[int, int], list[dict[str, Any]]] | None = None
+_connections: dict[tuple[tuple[str, Any], ...], Backend] = {}
+
+
+def get_db_targets(config: dict[str, Any]) -> list[dict[str, Any]]:
+    """Resolves the connection parameters of the DBs to inject into, from the
+    skeleton and the config. They are only resolved again once either file was
+    modified.
+
+    The ``db`` key of the skeleton is either the name of a DB, or a list of
+    DBs. Each item of the list is the name of a DB or a mapping with its
+    ``name`` and any of ``port``, ``user``, ``password``, ``host`` and
+    ``backend``, defaulting to the config. The ``sqlite`` backend is a local
+    stand-in, the name of the DB is then the path of its file
 
     :param config: serior configuration
-    :return: Cursor to the DB
+    :return: Name of the backend and keyword arguments of its connection, for each DB
     """
-    # TODO: test
-    with open('skeleton.yaml', 'r') as file:
-        data = yaml.full_load(file)
+    global _db_targets
+    stamp = (os.stat('skeleton.yaml').st_mtime_ns, os.stat(config['config_file']).st_mtime_ns)
+    if _db_targets is not None and _db_targets[0] == stamp:
+        return _db_targets[1]
 
+    # TODO: test
+    data = load_skeleton('skeleton.yaml')
     if 'db' not in data:
         raise ValueError("Le squelette n'a pas d'entrée \"db\", qui doit contenir le nom de la bdd.")
     elif not data['db']:
         raise ValueError("La clef \"db\" du squelette est vide")
 
-    return pcg.connect(database=data['db'], user=config['db_user'], password=config['db_pw'], port=config['db_port'], host='localhost').cursor()
+    # Same precedence as at startup, with the current content of the files
+    with open(config['config_file'], 'r') as file:
+        settings = {**config, **yaml.full_load(file), **(data.get('config') or {})}
+
+    targets = []
+    for db in data['db'] if isinstance(data['db'], list) else [data['db']]:
+        if not isinstance(db, dict):
+            db = {'name': db}
+        if not db.get('name'):
+            raise ValueError(f"Une des bdd de la clef \"db\" du squelette n'a pas de nom : {db}")
+        targets.append({
+            'database': db['name'],
+            'user': db.get('user', settings['db_user']),
+            'password': db.get('password', settings['db_pw']),
+            'port': db.get('port', settings['db_port']),
+            'host': db.get('host', 'localhost'),
+            'backend': db.get('backend', settings.get('db_backend', 'postgres')),
+        })
+        if targets[-1]['backend'] not in BACKENDS:
+            raise ValueError(f"Backend inconnu pour la bdd {db['name']} : {targets[-1]['backend']}. "
+                             f"Backends disponibles : {', '.join(BACKENDS)}")
+
+    # Parameters changed, the connections to the previous DBs won't be used anymore
+    keys = {tuple(sorted(target.items())) for target in targets}
+    for key in list(_connections):
+        if key not in keys:
+            _connections.pop(key).close()
+
+    _db_targets = (stamp, targets)
+    return targets
+
+
+_module: tuple[int, str] | None = None
+
+def get_module() -> str:
+    """Name of the module the scenario belongs to: the ``module`` key of the
+    skeleton, or else the module whose data directory ``location`` points to.
+    Only resolved again once the skeleton was modified
+
+    :return: Name of the module
+    """
+    global _module
+    stamp = os.stat('skeleton.yaml').st_mtime_ns
+    if _module is None or _module[0] != stamp:
+        module = load_skeleton('skeleton.yaml').get('module')
+        if not module:
+            module = os.path.basename(os.path.dirname(os.path.realpath('location')))
+        _module = (stamp, module)
+    return _module[1]
+
+
+def get_db_backend(target: dict[str, Any]) -> Backend:
+    """Produces the backend of a DB. Its connection is reused across calls as
+    long as it is healthy. Safe to use from several threads, each with its own DB
+
+    :param target: Connection parameters of the DB, see ``get_db_targets``
+    :return: Backend of the DB
+    """
+    key = tuple(sorted(target.items()))
+    backend = _connections.get(key)
+    if backend is not None and not backend.is_alive():
+        del _connections[key]
+        backend.close()
+        backend = None
+
+    if backend is None:
+        backend = BACKENDS[target['backend']](target)
+        _connections[key] = backend
+
+    return backend
+
+
+def close_connections() -> None:
+    """Closes the connections kept open"""
+    for backend in _connections.values():
+        if not backend.closed:
+            backend.close()
+    _connections.clear()
+
+
+atexit.register(close_connections)
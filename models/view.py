@@ -1,11 +1,83 @@
 from . import record
-from typing import Any, TYPE_CHECKING
+from . import serializer
+from .writer import FileWriter
+from typing import Any, TextIO, TYPE_CHECKING
 import re
 import lxml.etree as etree
 from collections.abc import Iterable
 
 RE_ARCH = re.compile(r'(<data>.*</data>)', flags=re.DOTALL)
 
+
+class SourceText:
+    """Text of a data file, read once, with the offset of each of its lines.
+    Lets the architecture of every view be searched for in place, instead of
+    reading the file again for each of them"""
+
+    def __init__(self, text: str):
+        """
+        :param text: Content of the file, as given to the XML parser
+        """
+        self.text = text
+        self.line_offsets = [0]
+        self.line_offsets.extend(match.end() for match in re.finditer('\n', text))
+
+    def offset(self, line: int) -> int:
+        """Offset of the start of a line in the text
+
+        :param line: Index of the line, from 0. Lines past the end of the text start at its end
+        """
+        if line >= len(self.line_offsets):
+            return len(self.text)
+        return self.line_offsets[line]
+
+    def span(self, start: int, end: int | None) -> tuple[str, int, int]:
+        """Locates a range of lines
+
+        :param start: Index of the first line, from 0
+        :param end: Index of the line after the last one, None for the end of the text
+        :return: Text holding the lines, and the offsets of their start and end in it
+        """
+        return self.text, self.offset(start), len(self.text) if end is None else self.offset(end)
+
+
+class StreamedText:
+    """Text of a data file read line by line, as the views are parsed. Only
+    the lines of a view are held at once, views must be read in order"""
+
+    def __init__(self, file: TextIO):
+        """
+        :param file: Data file, opened in text mode. Leading whitespace is
+            skipped, like the XML parser does
+        """
+        self.lines = iter(file)
+        self.pending = ''
+        for line in self.lines:
+            if line.strip():
+                self.pending = line.lstrip()
+                break
+        # Index of the pending line
+        self.line = 0
+
+    def span(self, start: int, end: int | None) -> tuple[str, int, int]:
+        """Reads a range of lines, discarding those before it
+
+        :param start: Index of the first line, from 0. Can't be before the end of the previous range
+        :param end: Index of the line after the last one, None for the end of the file
+        :return: Text of the lines, and the offsets of its start and end
+        """
+        if start < self.line:
+            raise ValueError(f"Ligne {start} déjà lue, les vues doivent être lues dans l'ordre")
+        chunks = []
+        while self.pending and (end is None or self.line < end):
+            if self.line >= start:
+                chunks.append(self.pending)
+            self.pending = next(self.lines, '')
+            self.line += 1
+        text = ''.join(chunks)
+        return text, 0, len(text)
+
+
 class View(record.Record):
 
     deprecated: bool = False
@@ -15,6 +87,9 @@ class View(record.Record):
     model_id: str = 'ir.ui.view.ionic'
     inherit: str = ''
     name: str = 'Accueil'
+    _xml_model = 'ir.ui.view.ionic'
+    _table = 'ir_ui_view_ionic'
+    _db_columns = ('raw_architecture', 'architecture', 'is_translatable_architecture')
     if TYPE_CHECKING:
         arch: str
         xml_id: str
@@ -24,10 +99,10 @@ class View(record.Record):
         self._code_attr = code_field
         self._ext = ext
 
-    def to_dict(self, prefix) -> dict[str, Any]:
+    def to_dict(self, prefix, writer: FileWriter | None = None) -> dict[str, Any]:
         """Transforms the record into a dictionary, omitting as many values as
         possible (values that are the same as the defaults are skipped)"""
-        vals = super().to_dict(prefix, ['identifier'])
+        vals = super().to_dict(prefix, ['identifier'], writer)
 
         if vals['identifier'] == vals['id']:
             del vals['identifier']
@@ -60,9 +135,13 @@ class View(record.Record):
         return view
 
     @classmethod
-    def from_xml(cls, node: Any, filename: str) -> "View":
+    def from_xml(cls, node: Any, source: SourceText | StreamedText) -> "View":
         """Reconstructs a record from an xml node, guessing as many values as
-        possible"""
+        possible
+
+        :param node: Node of the record
+        :param source: Text of the data file the node was parsed from
+        """
         view = cls()
         view.xml_id = node.get('id')
         err_msg = f'La vue "{view.xml_id}" n\'a pas de balise'
@@ -86,19 +165,19 @@ class View(record.Record):
             if tmp is None:
                 raise ValueError(f'{err_msg} "architecture" ou "raw_architecture"')
             view.raw = False
-        view.arch = cls.__get_arch_content(tmp, filename)
+        view.arch = cls.__get_arch_content(tmp, source)
 
         tmp = node.find('field[@name="is_deprecated"]')
         if tmp is None:
             view.deprecated = cls.deprecated
         else:
-            view.deprecated = bool(eval(tmp.get('eval', 'False')))
+            view.deprecated = bool(record.eval_literal(tmp.get('eval', 'False')))
 
         tmp = node.find('field[@name="is_security_check"]')
         if tmp is None:
             view.secure = cls.secure
         else:
-            view.secure = bool(eval(tmp.get('eval', 'False')))
+            view.secure = bool(record.eval_literal(tmp.get('eval', 'False')))
 
         # Évalue le domaine de recherche pour obtenir le nom du modèle
         tmp = node.find('field[@name="model_id"]')
@@ -109,7 +188,7 @@ class View(record.Record):
             if not model_str:
                 view.model_id = cls.model_id
             else:
-                value: Any | list[tuple[str, str, str]] = eval(model_str)
+                value: Any | list[tuple[str, str, str]] = record.eval_literal(model_str)
                 search_err_msg = f"La vue {view.xml_id} a un modèle d'une autre forme que \"[('model', '=', 'NOM.DU.MODÈLE')]\""
                 if not isinstance(value, Iterable) or len(value) != 1:
                     raise ValueError(search_err_msg)
@@ -127,7 +206,7 @@ class View(record.Record):
         if tmp is None:
             view.translatable = cls.translatable
         else:
-            intermediate = eval(tmp.get('eval'))
+            intermediate = record.eval_literal(tmp.get('eval'))
             if intermediate is not None:
                 view.translatable = bool(intermediate)
             else:
@@ -135,63 +214,49 @@ class View(record.Record):
 
         return view
 
-    def to_xml(self) -> str:
-        """Transforms the record into a string of its XML serialization, omitting
-        superfluous values
-        """
-        return '\n'.join(filter(lambda x: x is not None, [
-            f"""    <record id="{self.xml_id}" model="ir.ui.view.ionic">""",
-            f"""        <field name="identifier">{self.identifier}</field>""",
-            f"""        <field name="name">{self.name}</field>""",
-            f"""        <field name="is_deprecated" eval="{self.deprecated}"/>""" if self.deprecated else None,
-            f"""        <field name="inherited_view_id" ref="{self.inherit}"/>""" if self.inherit else None,
-            f"""        <field name="model_id" search="[('model', '=', '{self.model_id}')]"/>""",
-            f"""        <field name="is_translatable_architecture" eval="{self.translatable}"/>""" if self.translatable is not None else None,
-            f"""        <field name="is_security_check" eval="{self.secure}"/>""" if not self.secure else None,
-            f"""        <field name="{'raw_' * self.raw}architecture" type="xml">""",
-            f"""{self.arch.strip()}""",
-            f"""        </field>""",
-            f"""    </record>""",
-            f"""""",
-        ]))
-
-    def inject(self, cursor: Any) -> None:
-        """Injects view's architecture in the DB. Does not commit
-
-        :param cursor: Database cursor
-        """
-        arch = self.arch.replace("'", "''")
-        cursor.execute(f"""
-            UPDATE ir_ui_view_ionic
-            SET {'raw_' if self.raw else ''}architecture = '{arch}',
-                is_translatable_architecture = '{bool(self.translatable)}'
-            WHERE identifier = '{self.identifier}'
-        """)
+    _serialize = serializer.compile_layout('View', (
+        """    <record id="{self.xml_id}" model="{self._xml_model}">""",
+        """        <field name="identifier">{self.identifier}</field>""",
+        """        <field name="name">{self.name}</field>""",
+        ("""        <field name="is_deprecated" eval="{self.deprecated}"/>""", "self.deprecated"),
+        ("""        <field name="inherited_view_id" ref="{self.inherit}"/>""", "self.inherit"),
+        """        <field name="model_id" search="[('model', '=', '{self.model_id}')]"/>""",
+        ("""        <field name="is_translatable_architecture" eval="{self.translatable}"/>""", "self.translatable is not None"),
+        ("""        <field name="is_security_check" eval="{self.secure}"/>""", "not self.secure"),
+        """        <field name="{'raw_' * self.raw}architecture" type="xml">""",
+        """{self.arch.strip()}""",
+        """        </field>""",
+        """    </record>""",
+    ), globals())
+
+    def _db_values(self) -> dict[str, Any]:
+        """Values of the columns set by the injection, as stored in the DB"""
+        return {
+            f"{'raw_' if self.raw else ''}architecture": self.arch,
+            'is_translatable_architecture': bool(self.translatable),
+        }
 
     @classmethod
-    def __get_arch_content(cls, node: Any, filename: str) -> str:
+    def __get_arch_content(cls, node: Any, source: SourceText | StreamedText) -> str:
         """Attempts to extracts the content of the architecture field, without
         having the xml canonicalization mess it up
 
         :param node: Node of the architecture field
-        :param filename: Name/path of the xml file
+        :param source: Text of the data file
         :return: The content of the architecture field
         """
+        # From the line after the field's opening tag to the line of the next record
         starting_line = node.sourceline
         # You never know when someone's gonna decide that putting a view
         # as the last thing in the file is a viable choice
         if node.getparent().getnext() is not None:
             next_elem_starting_line = node.getparent().getnext().sourceline
         else:
-            next_elem_starting_line = 999999
-
-        with open(filename, 'r') as file:
-            lines = file.readlines()[starting_line:next_elem_starting_line]
-
-        content = ''.join(lines)
+            next_elem_starting_line = None
 
-        re_res = RE_ARCH.findall(content)
+        # Searched within the bounds of the view, without copying them out of the text
+        re_res = RE_ARCH.search(*source.span(starting_line, next_elem_starting_line))
         if not re_res:
             raise ValueError(f"La vue {node.getparent().get('id')} semble ne pas avoir de tags <data> autour de son contenu")
 
-        return re_res[0].strip()
+        return re_res[1].strip()
@@ -0,0 +1,89 @@
+"""Concurrent writes of the files of a project.
+
+Files whose content wouldn't change are left untouched, so that their
+modification time stays the same for watchers, git and network filesystems.
+"""
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+
+class FileWriter:
+    def __init__(self, max_workers: int = 8):
+        """
+        :param max_workers: Number of files written at once
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures: list[Future] = []
+        # Paths of the files, by outcome of their write
+        self.report: dict[str, list[str]] = {'added': [], 'changed': [], 'unchanged': []}
+
+    def __enter__(self) -> "FileWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, path: str, content: str) -> None:
+        """Writes a file in the background, unless it already has this content
+
+        :param path: Path of the file
+        :param content: Content of the file
+        """
+        self._futures.append(self._pool.submit(self._write, path, content.encode()))
+
+    def move(self, source: str, path: str) -> None:
+        """Moves a file over another in the background, unless they already
+        have the same content, in which case the source is removed
+
+        :param source: Path of the file to move
+        :param path: Destination of the file
+        """
+        self._futures.append(self._pool.submit(self._move, source, path))
+
+    def close(self) -> dict[str, list[str]]:
+        """Waits for the writes to be done
+
+        :return: Paths of the files added, changed and left unchanged
+        :raises OSError: One of the writes failed
+        """
+        try:
+            for future in self._futures:
+                status, path = future.result()
+                self.report[status].append(path)
+        finally:
+            self._futures.clear()
+            self._pool.shutdown()
+        return self.report
+
+    @staticmethod
+    def _status(path: str, content: bytes) -> str:
+        """Compares the content with that of the file
+
+        :return: ``added`` if the file doesn't exist, ``changed`` if its content
+            differs, ``unchanged`` otherwise
+        """
+        try:
+            if os.path.getsize(path) != len(content):
+                return 'changed'
+            with open(path, 'rb') as file:
+                return 'unchanged' if file.read() == content else 'changed'
+        except FileNotFoundError:
+            return 'added'
+
+    def _write(self, path: str, content: bytes) -> tuple[str, str]:
+        status = self._status(path, content)
+        if status != 'unchanged':
+            with open(path, 'wb') as file:
+                file.write(content)
+        return status, path
+
+    def _move(self, source: str, path: str) -> tuple[str, str]:
+        with open(source, 'rb') as file:
+            status = self._status(path, file.read())
+        if status == 'unchanged':
+            os.remove(source)
+        else:
+            os.replace(source, path)
+        return status, path
@@ -0,0 +1,56 @@
+"""Startup of the commands that don't touch a project: editor integrations
+call them constantly, they must not load the heavy dependencies"""
+
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+# Loaded by the commands that work on a project, never at startup
+HEAVY_MODULES = ('yaml', 'lxml', 'psycopg2', 'inotify', 'models')
+
+# Generous, so that a slow CI machine doesn't fail: the imports above are
+# what would make startup regress
+MAX_DURATION = 2.0
+
+
+def _imported_modules(args: list[str], cwd: str) -> set[str]:
+    """Runs serior and lists the modules it imported
+
+    :param args: Arguments of serior
+    :param cwd: Directory to run serior in
+    :return: Names of the imported modules
+    """
+    env = dict(os.environ, XDG_CONFIG_HOME=os.path.join(cwd, 'config'), EDITOR='true')
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', MAIN, *args],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    duration = time.perf_counter() - start
+    assert result.returncode == 0, result.stderr
+    assert duration < MAX_DURATION
+
+    modules = set()
+    for line in result.stderr.splitlines():
+        # import time: <self us> | <cumulative us> | <indented name>
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return modules
+
+
+@pytest.mark.parametrize('args', [['--version'], ['config']])
+def test_startup_imports(args, tmp_path):
+    # A project in the current directory must not be read either
+    (tmp_path / 'skeleton.yaml').write_text('prefix: [unparsable\n')
+    modules = _imported_modules(args, str(tmp_path))
+
+    assert 'argparse' in modules
+    heavy = {name for name in modules if name.split('.')[0] in HEAVY_MODULES}
+    assert not heavy
+    # Only the module of the command that runs
+    commands = {name for name in modules if name.startswith('commands.')}
+    assert commands <= ({'commands.config'} if args == ['config'] else set())